@@ -1,14 +1,65 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, abort
+from flask import Flask, Blueprint, render_template, get_template_attribute, request, jsonify, session, redirect, url_for, abort, Response, \
+    stream_with_context, make_response, current_app, has_app_context, has_request_context, g, before_render_template, \
+    template_rendered
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from markupsafe import Markup
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from urllib.parse import urlencode
+import base64
+import click
+import csv
+import functools
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import random
 import re
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///books.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from config.app_config import load_app_config
+from utils.cache import LRUCache
+from utils.compression import CompressionStats, available_encodings, compress, negotiate
+from utils import export
+from utils.isbn import isbn_key, to_isbn13
+from utils.jobs import JobCancelled, JobRunner, QueueFull
+from utils import metrics
+from utils.serialization import FORMATS, dumps, to_record, to_records
+from utils import shards
+from utils.suggest import SuggestIndex
+from utils.structured_logging import ContextFilter, JSONFormatter, Truncated, attach_queue
+from utils.tracing import Trace, TraceExporter
+
+
+class RoutingSession(Session):
+    """Send queries to the shard chosen with shard_scope, and those made while serving
+    GET/HEAD requests to the read-only engine, if configured."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = shards.current_shard.get()
+        if bind is None and shard is not None:
+            return self._db.engines[f'shard{shard}']
+        if (bind is None and not self._flushing and has_request_context()
+                and request.method in ('GET', 'HEAD') and 'read' in self._db.engines):
+            return self._db.engines['read']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+bp = Blueprint('books', __name__)
 
 
 # Database Models
@@ -23,25 +74,633 @@ class Book(db.Model):
     title = db.Column(db.String(200), nullable=False)
     author = db.Column(db.String(200), nullable=False)
     isbn = db.Column(db.String(13), unique=True, nullable=False)
+    # Canonical ISBN-13 of `isbn` (see utils.isbn.isbn_key), used for duplicate checks and exact lookups
+    isbn13 = db.Column(db.String(13), unique=True, index=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+    # One index per filter/sort combination of GET /api/books (see BOOK_LIST_INDEXES); each ends
+    # in id so keyset pagination can seek on (sort key, id).  AUTOINCREMENT keeps ids from being
+    # reused, and lets each shard start its ids at its own offset (see init_shard).
+    __table_args__ = (
+        db.Index('ix_book_title_id', 'title', 'id'),
+        db.Index('ix_book_author_id', 'author', 'id'),
+        db.Index('ix_book_created_at_id', 'created_at', 'id'),
+        db.Index('ix_book_author_title_id', 'author', 'title', 'id'),
+        db.Index('ix_book_author_created_at_id', 'author', 'created_at', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+
+class CatalogState(db.Model):
+    # Single row (id=1) whose version is bumped by every write to Book
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class BookChange(db.Model):
+    # Append-only log of writes to Book, one row per inserted, updated or deleted book, written in the
+    # same transaction as the write.  SQLite serializes writers, so seq order is commit order, and
+    # AUTOINCREMENT keeps seqs from being reused.  Deletes are tombstones with only book_id set.
+    seq = db.Column(db.Integer, primary_key=True)
+    op = db.Column(db.String(6), nullable=False)
+    book_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(200))
+    author = db.Column(db.String(200))
+    isbn = db.Column(db.String(13))
+    version = db.Column(db.Integer)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+
+class Job(db.Model):
+    # A background job run by one worker's JobRunner; any worker can report on it or cancel it
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, index=True)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    counts = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    pid = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+# Columns added to existing tables after their first release; create_all does
+# not alter tables, so init_db adds whichever ones are missing.
+SCHEMA_UPGRADES = {
+    'book': {
+        'version': "ALTER TABLE book ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+        'isbn13': "ALTER TABLE book ADD COLUMN isbn13 VARCHAR(13) NOT NULL DEFAULT ''",
+    },
+}
+
+
+def upgrade_schema(engine=None):
+    engine = engine or db.engine
+    inspector = db.inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in SCHEMA_UPGRADES.items():
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for column, statement in columns.items():
+                if column not in existing:
+                    conn.exec_driver_sql(statement)
+        backfill_isbn13(conn)
+        # create_all does not add new indexes to existing tables either
+        for index in Book.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def backfill_isbn13(conn):
+    """Fill in the canonical ISBN of rows written before the column existed."""
+    rows = conn.exec_driver_sql("SELECT id, isbn FROM book WHERE isbn13 = '' ORDER BY id").all()
+    if not rows:
+        return
+    taken = set(conn.exec_driver_sql("SELECT isbn13 FROM book WHERE isbn13 != ''").scalars())
+    keys = []
+    for book_id, isbn in rows:
+        key = isbn_key(isbn)
+        if key in taken:
+            # The same book stored twice (e.g. as ISBN-10 and ISBN-13); keep it, but under a key no lookup matches
+            current_app.logger.warning("Book %s duplicates ISBN %s of an earlier book", book_id, key)
+            key = f'{key}-{book_id}'
+        taken.add(key)
+        keys.append({'key': key, 'id': book_id})
+    conn.execute(db.text("UPDATE book SET isbn13 = :key WHERE id = :id"), keys)
+
+
+# Full-text index over Book, kept in sync by triggers so every write path
+# (ORM or bulk SQL) updates it in the same transaction.  Bulk imports set
+# book_fts_control.deferred and index their rows with one INSERT ... SELECT
+# per batch instead, which is several times faster than per-row triggers.
+BOOK_FTS_TABLES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5("
+    "title, author, isbn, content='book', content_rowid='id', prefix='2 3')",
+    "CREATE TABLE IF NOT EXISTS book_fts_control (id INTEGER PRIMARY KEY, deferred INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO book_fts_control (id, deferred) VALUES (1, 0)",
+]
+
+BOOK_FTS_TRIGGERS = {
+    'book_fts_ai':
+        "CREATE TRIGGER book_fts_ai AFTER INSERT ON book "
+        "WHEN (SELECT deferred FROM book_fts_control WHERE id = 1) = 0 BEGIN "
+        "INSERT INTO book_fts(rowid, title, author, isbn) VALUES (new.id, new.title, new.author, new.isbn); "
+        "END",
+    'book_fts_ad':
+        "CREATE TRIGGER book_fts_ad AFTER DELETE ON book BEGIN "
+        "INSERT INTO book_fts(book_fts, rowid, title, author, isbn) "
+        "VALUES ('delete', old.id, old.title, old.author, old.isbn); "
+        "END",
+    'book_fts_au':
+        "CREATE TRIGGER book_fts_au AFTER UPDATE OF title, author, isbn ON book BEGIN "
+        "INSERT INTO book_fts(book_fts, rowid, title, author, isbn) "
+        "VALUES ('delete', old.id, old.title, old.author, old.isbn); "
+        "INSERT INTO book_fts(rowid, title, author, isbn) VALUES (new.id, new.title, new.author, new.isbn); "
+        "END",
+}
+
+
+def fts_enabled():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def init_fts(engine=None):
+    with (engine or db.engine).begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_fts'"
+        ).first()
+        for statement in BOOK_FTS_TABLES:
+            conn.exec_driver_sql(statement)
+        # Recreate the triggers so existing databases pick up definition changes
+        for name, statement in BOOK_FTS_TRIGGERS.items():
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+            conn.exec_driver_sql(statement)
+        if not exists:
+            # Index the rows that were written before the table existed
+            conn.exec_driver_sql("INSERT INTO book_fts(book_fts) VALUES ('rebuild')")
+
+
+# Catalog statistics behind /api/books/stats: book counts in total, per author
+# and per day of created_at, kept by triggers in the same transaction as the
+# write, so reading them costs one index probe or range instead of a scan of
+# book.  Bulk imports defer them with the full-text index and add each batch
+# with one grouped upsert per table (BOOK_STATS_APPEND).  Each table is the
+# result of its BOOK_STATS_SOURCES query, which `flask books reconcile-stats`
+# compares them against and rebuilds them from.
+BOOK_STATS_TABLES = [
+    "CREATE TABLE IF NOT EXISTS book_stats (id INTEGER PRIMARY KEY, books INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS book_author_stats (author VARCHAR(200) PRIMARY KEY, books INTEGER NOT NULL) "
+    "WITHOUT ROWID",
+    # Serves the top authors in order: ORDER BY books DESC, author LIMIT n reads n entries
+    "CREATE INDEX IF NOT EXISTS ix_book_author_stats_books ON book_author_stats (books DESC, author)",
+    "CREATE TABLE IF NOT EXISTS book_day_stats (day VARCHAR(10) PRIMARY KEY, books INTEGER NOT NULL) WITHOUT ROWID",
+]
+
+BOOK_STATS_SOURCES = {
+    'book_stats': "SELECT 1, count(*) FROM book",
+    'book_author_stats': "SELECT author, count(*) FROM book GROUP BY author",
+    'book_day_stats': "SELECT date(created_at), count(*) FROM book WHERE created_at IS NOT NULL GROUP BY 1",
+}
+
+# A count that reaches zero deletes its row, so the top authors and the
+# histogram only hold authors and days that have books
+BOOK_STATS_TRIGGERS = {
+    'book_stats_ai':
+        "CREATE TRIGGER book_stats_ai AFTER INSERT ON book "
+        "WHEN (SELECT deferred FROM book_fts_control WHERE id = 1) = 0 BEGIN "
+        "UPDATE book_stats SET books = books + 1 WHERE id = 1; "
+        "INSERT INTO book_author_stats (author, books) VALUES (new.author, 1) "
+        "ON CONFLICT (author) DO UPDATE SET books = books + 1; "
+        "INSERT INTO book_day_stats (day, books) SELECT date(new.created_at), 1 WHERE new.created_at IS NOT NULL "
+        "ON CONFLICT (day) DO UPDATE SET books = books + 1; "
+        "END",
+    'book_stats_ad':
+        "CREATE TRIGGER book_stats_ad AFTER DELETE ON book BEGIN "
+        "UPDATE book_stats SET books = books - 1 WHERE id = 1; "
+        "UPDATE book_author_stats SET books = books - 1 WHERE author = old.author; "
+        "DELETE FROM book_author_stats WHERE author = old.author AND books <= 0; "
+        "UPDATE book_day_stats SET books = books - 1 WHERE day = date(old.created_at); "
+        "DELETE FROM book_day_stats WHERE day = date(old.created_at) AND books <= 0; "
+        "END",
+    'book_stats_au_author':
+        "CREATE TRIGGER book_stats_au_author AFTER UPDATE OF author ON book "
+        "WHEN old.author IS NOT new.author BEGIN "
+        "INSERT INTO book_author_stats (author, books) VALUES (new.author, 1) "
+        "ON CONFLICT (author) DO UPDATE SET books = books + 1; "
+        "UPDATE book_author_stats SET books = books - 1 WHERE author = old.author; "
+        "DELETE FROM book_author_stats WHERE author = old.author AND books <= 0; "
+        "END",
+    'book_stats_au_day':
+        "CREATE TRIGGER book_stats_au_day AFTER UPDATE OF created_at ON book "
+        "WHEN date(old.created_at) IS NOT date(new.created_at) BEGIN "
+        "INSERT INTO book_day_stats (day, books) SELECT date(new.created_at), 1 WHERE new.created_at IS NOT NULL "
+        "ON CONFLICT (day) DO UPDATE SET books = books + 1; "
+        "UPDATE book_day_stats SET books = books - 1 WHERE day = date(old.created_at); "
+        "DELETE FROM book_day_stats WHERE day = date(old.created_at) AND books <= 0; "
+        "END",
+}
+
+# Adds the books with id > ? to the statistics, for a bulk batch inserted with the triggers deferred
+BOOK_STATS_APPEND = [
+    "UPDATE book_stats SET books = books + (SELECT count(*) FROM book WHERE id > ?) WHERE id = 1",
+    "INSERT INTO book_author_stats (author, books) SELECT author, count(*) FROM book WHERE id > ? GROUP BY author "
+    "ON CONFLICT (author) DO UPDATE SET books = books + excluded.books",
+    "INSERT INTO book_day_stats (day, books) SELECT date(created_at), count(*) FROM book "
+    "WHERE id > ? AND created_at IS NOT NULL GROUP BY 1 ON CONFLICT (day) DO UPDATE SET books = books + excluded.books",
+]
+
+book_stats = db.table('book_stats', db.column('id'), db.column('books'))
+book_author_stats = db.table('book_author_stats', db.column('author'), db.column('books'))
+book_day_stats = db.table('book_day_stats', db.column('day'), db.column('books'))
+
+
+def init_stats(engine=None):
+    """Create the statistics tables and triggers; needs book_fts_control, so runs after init_fts."""
+    with (engine or db.engine).begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_stats'"
+        ).first()
+        for statement in BOOK_STATS_TABLES:
+            conn.exec_driver_sql(statement)
+        for name, statement in BOOK_STATS_TRIGGERS.items():
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+            conn.exec_driver_sql(statement)
+        if not exists:
+            # Count the rows that were written before the tables existed
+            rebuild_stats(conn)
+
+
+def rebuild_stats(conn):
+    for table, source in BOOK_STATS_SOURCES.items():
+        conn.exec_driver_sql(f"DELETE FROM {table}")
+        conn.exec_driver_sql(f"INSERT INTO {table} {source}")
+
+
+def stats_drift(conn):
+    """{table: rows that differ from its source query}, for every table with any."""
+    drift = {}
+    for table, source in BOOK_STATS_SOURCES.items():
+        stored = f"SELECT * FROM {table}"
+        differing = conn.exec_driver_sql(
+            f"SELECT (SELECT count(*) FROM ({source} EXCEPT {stored})) + (SELECT count(*) FROM ({stored} EXCEPT {source}))"
+        ).scalar()
+        if differing:
+            drift[table] = differing
+    return drift
+
+
+def reconcile_stats(engine, rebuild=True):
+    """Check the statistics of `engine`'s database against book and, with `rebuild`, recount them.
+
+    The rebuild holds the write lock from the check to the verification after
+    it, so no write can land in between and the two describe the same books.
+    """
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('BEGIN IMMEDIATE' if rebuild else 'BEGIN')
+        try:
+            report = {'drift': stats_drift(conn)}
+            if rebuild:
+                rebuild_stats(conn)
+                report['drift_after_rebuild'] = stats_drift(conn)
+            conn.exec_driver_sql('COMMIT')
+        except Exception:
+            conn.exec_driver_sql('ROLLBACK')
+            raise
+    return report
+
+
+# Sharded storage (SHARD_DATABASE_URIS): each shard holds these tables for its slice of the books.
+# A book whose ISBN was changed to one that hashes to another shard stays where it is, and the
+# ISBN's own shard records an isbn_claim for it; the triggers make an ISBN unique across a shard's
+# books and claims, so every ISBN is unique across all shards.
+SHARD_TABLES = [Book.__table__, CatalogState.__table__, BookChange.__table__]
+
+SHARD_CLAIM_DDL = [
+    "CREATE TABLE IF NOT EXISTS isbn_claim (isbn13 VARCHAR(13) PRIMARY KEY, book_id INTEGER NOT NULL)",
+    # RAISE(IGNORE) skips the row, like the ON CONFLICT DO NOTHING the inserts already use
+    "CREATE TRIGGER IF NOT EXISTS book_claimed_bi BEFORE INSERT ON book "
+    "WHEN EXISTS (SELECT 1 FROM isbn_claim WHERE isbn13 = new.isbn13) BEGIN SELECT RAISE(IGNORE); END",
+    "CREATE TRIGGER IF NOT EXISTS book_claimed_bu BEFORE UPDATE OF isbn13 ON book "
+    "WHEN EXISTS (SELECT 1 FROM isbn_claim WHERE isbn13 = new.isbn13) BEGIN "
+    "SELECT RAISE(ABORT, 'UNIQUE constraint failed: book.isbn13'); END",
+    "CREATE TRIGGER IF NOT EXISTS isbn_claim_bi BEFORE INSERT ON isbn_claim "
+    "WHEN EXISTS (SELECT 1 FROM book WHERE isbn13 = new.isbn13) BEGIN SELECT RAISE(IGNORE); END",
+]
+
+
+def init_shard(shard):
+    engine = db.engines[f'shard{shard}']
+    db.metadata.create_all(engine, tables=SHARD_TABLES)
+    upgrade_schema(engine)
+    init_fts(engine)
+    init_stats(engine)
+    with engine.begin() as conn:
+        for statement in SHARD_CLAIM_DDL:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql("INSERT OR IGNORE INTO catalog_state (id, version) VALUES (1, 0)")
+        # AUTOINCREMENT continues from the larger of this and the highest id, so a shard's
+        # ids start at its offset and never run into another shard's
+        conn.exec_driver_sql(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'book', ? "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'book')", (shard * shards.ID_SPAN,)
+        )
+
+
+isbn_claim = db.table('isbn_claim', db.column('isbn13'), db.column('book_id'))
+
+
+def shard_count():
+    """Number of shards, or 0 with unsharded storage."""
+    return len(current_app.config['SHARD_DATABASE_URIS'])
+
+
+@contextmanager
+def shard_scope(shard):
+    """Route the session to `shard` inside the block; None (unsharded storage) leaves it as it is."""
+    if shard is None:
+        yield
+        return
+    token = shards.current_shard.set(shard)
+    try:
+        yield
+    finally:
+        shards.current_shard.reset(token)
+
+
+def book_shard(book_id):
+    """The shard holding book `book_id`, or None with unsharded storage."""
+    count = shard_count()
+    return shards.shard_for_id(book_id, count) if count else None
+
+
+def isbn_shard(key):
+    """The shard owning canonical ISBN `key` (its book or its claim), or None with unsharded storage."""
+    count = shard_count()
+    return shards.shard_for_key(key, count) if count else None
+
+
+def scatter(fn):
+    """[fn(connection), ...] for every shard, run in parallel with a connection each."""
+    engines = [db.engines[f'shard{shard}'] for shard in range(shard_count())]
+
+    def run(shard):
+        with engines[shard].connect() as connection:
+            return fn(connection)
+    return current_app.extensions['shard_pool'].map(run)
+
 
+def read_books(query, key=None, descending=False, limit=None):
+    """The rows of `query`, from the session or from every shard merged in `key` order."""
+    if not shard_count():
+        return db.session.execute(query).all()
+    return shards.merge(scatter(lambda connection: connection.execute(query).all()), key, descending, limit)
 
-def init_db():
+
+def claim_isbn(shard, key, book_id):
+    """Record in `shard` that ISBN `key` is held by book `book_id` of another shard; False if it is taken there."""
+    with db.engines[f'shard{shard}'].begin() as connection:
+        return connection.execute(
+            db.text("INSERT INTO isbn_claim (isbn13, book_id) VALUES (:key, :book_id) ON CONFLICT DO NOTHING"),
+            {'key': key, 'book_id': book_id}
+        ).rowcount == 1
+
+
+def release_claim(shard, key, book_id):
+    with db.engines[f'shard{shard}'].begin() as connection:
+        connection.execute(db.delete(isbn_claim).where(isbn_claim.c.isbn13 == key, isbn_claim.c.book_id == book_id))
+
+
+def with_book_shard(view):
+    """Run a view taking a book_id with the session routed to that book's shard."""
+    @functools.wraps(view)
+    def routed(book_id, **kwargs):
+        with shard_scope(book_shard(book_id)):
+            return view(book_id, **kwargs)
+    return routed
+
+
+def unsharded_only(view):
+    """Answer 501 with sharded storage, for views that need the whole catalog in one database."""
+    @functools.wraps(view)
+    def guarded(*args, **kwargs):
+        if shard_count():
+            return jsonify({'error': 'Not available with sharded storage'}), 501
+        return view(*args, **kwargs)
+    return guarded
+
+
+def init_db(app):
     with app.app_context():
-        db.create_all()
+        # Only the main database's tables: db keeps the metadata of every bind any app in the
+        # process has configured, and init_shard builds the shards' tables itself
+        db.create_all(bind_key=None)
+        upgrade_schema()
+        if not db.session.get(CatalogState, 1):
+            db.session.add(CatalogState(id=1, version=0))
+            db.session.commit()
+        if fts_enabled():
+            init_fts()
+            init_stats()
+        for shard in range(shard_count()):
+            init_shard(shard)
+        # No job survives a restart
+        interrupt_jobs('Interrupted by a server restart')
         if not User.query.filter_by(username="test_user").first():
             test_user = User(username="test_user", password="test_pass123")
             db.session.add(test_user)
             db.session.commit()
 
 
+def apply_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+slow_query_logger = logging.getLogger('books.slow_queries')
+
+
+def explain_query_plan(cursor, statement, parameters):
+    """EXPLAIN QUERY PLAN for a SQLite statement, as one line per plan step."""
+    try:
+        plan_cursor = cursor.connection.cursor()
+        try:
+            return [row[-1] for row in plan_cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+        finally:
+            plan_cursor.close()
+    except Exception as e:
+        return [f'unavailable: {e}']
+
+
+def instrument_engine(engine, slow_query_ms):
+    """Feed every statement's duration to the request metrics, the trace and the slow-query log."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        context.statement_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        started = context.statement_started
+        duration = time.perf_counter() - started
+        if has_request_context():
+            request_metrics = g.get('request_metrics')
+            if request_metrics is not None:
+                request_metrics.add_statement(duration)
+            trace = g.get('trace')
+            if trace is not None:
+                trace.add_statement(statement, started, duration, executemany)
+
+        if duration * 1000 >= slow_query_ms:
+            plan = None
+            if (engine.dialect.name == 'sqlite' and not executemany
+                    and statement.lstrip()[:6].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE')):
+                plan = explain_query_plan(cursor, statement, parameters)
+            slow_query_logger.warning("Slow query (%.1f ms)", duration * 1000, extra={
+                'duration_ms': round(duration * 1000, 3),
+                'statement': statement,
+                'parameters': parameters if not executemany else f'{len(parameters)} parameter sets',
+                'plan': plan
+            })
+
+
+def start_request_metrics():
+    # Blueprint prefix dropped, so labels read get_books, search_books, ...
+    endpoint = request.endpoint.rpartition('.')[2] if request.endpoint else 'unmatched'
+    g.request_metrics = metrics.RequestMetrics(endpoint, request.method)
+
+
+def record_request_metrics(response):
+    request_metrics = g.get('request_metrics')
+    if request_metrics is not None:
+        request_metrics.record(response.status_code)
+    return response
+
+
+def finish_request_metrics(error=None):
+    request_metrics = g.get('request_metrics')
+    if request_metrics is not None:
+        request_metrics.close()
+
+
+def start_request_trace():
+    if random.random() < current_app.config['TRACE_SAMPLE_RATE']:
+        g.trace = Trace(request.endpoint or 'unmatched', request.method, request.path)
+
+
+def finish_request_trace(response):
+    trace = g.get('trace')
+    if trace is not None:
+        g.trace = None
+        finished = trace.finish(response.status_code, current_app.config['TRACE_N_PLUS_ONE_THRESHOLD'])
+        if finished['n_plus_one']:
+            current_app.logger.warning("Possible N+1 queries in %s (trace %s): %s",
+                                       trace.name, trace.trace_id, finished['n_plus_one'])
+        current_app.extensions['trace_exporter'].export(finished)
+        response.headers['X-Trace-Id'] = trace.trace_id
+    return response
+
+
+def log_context():
+    """Request attributes stamped on every log record, on the thread that logs it."""
+    if not has_request_context():
+        return None
+    context = g.get('log_context')
+    if context is None:
+        trace = g.get('trace')
+        context = g.log_context = {
+            'endpoint': request.endpoint.rpartition('.')[2] if request.endpoint else None,
+            'method': request.method,
+            'path': request.path,
+            'trace_id': trace.trace_id if trace is not None else None
+        }
+    return context
+
+
+def init_logging(app):
+    context_filter = ContextFilter(log_context, app.config['LOG_SAMPLE_RATES'])
+    formatter = JSONFormatter()
+    handlers = [logging.StreamHandler()]
+    if app.config['LOG_FILE']:
+        os.makedirs(os.path.dirname(app.config['LOG_FILE']) or '.', exist_ok=True)
+        handlers.append(logging.FileHandler(app.config['LOG_FILE']))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+    attach_queue(app.logger, handlers, app.config['LOG_QUEUE_SIZE'], context_filter)
+
+    if not slow_query_logger.handlers:
+        os.makedirs(os.path.dirname(app.config['SLOW_QUERY_LOG']) or '.', exist_ok=True)
+        handler = logging.FileHandler(app.config['SLOW_QUERY_LOG'])
+        handler.setFormatter(formatter)
+        attach_queue(slow_query_logger, [handler], app.config['LOG_QUEUE_SIZE'], context_filter)
+
+
+def start_template_span(sender, template, context, **extra):
+    trace = g.get('trace')
+    if trace is not None:
+        trace.start_template(template.name)
+
+
+def end_template_span(sender, template, context, **extra):
+    trace = g.get('trace')
+    if trace is not None:
+        trace.end_template()
+
+
+def create_app(config_name=None):
+    app = Flask(__name__)
+    load_app_config(app, config_name)
+    # Binds do not inherit SQLALCHEMY_ENGINE_OPTIONS, so pass the pool settings explicitly
+    binds = {}
+    if app.config['READ_DATABASE_URI']:
+        binds['read'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'], url=app.config['READ_DATABASE_URI'])
+    shard_uris = app.config['SHARD_DATABASE_URIS']
+    if shard_uris and not all(uri.startswith('sqlite') for uri in [app.config['SQLALCHEMY_DATABASE_URI'], *shard_uris]):
+        raise ValueError('Sharded storage needs SQLite for the main database and every shard')
+    for shard, uri in enumerate(shard_uris):
+        binds[f'shard{shard}'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'], url=uri)
+    if binds:
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            instrument_engine(engine, app.config['SLOW_QUERY_MS'])
+            if engine.dialect.name != 'sqlite':
+                continue
+            pragmas = dict(app.config['SQLITE_PRAGMAS'])
+            if bind_key == 'read':
+                # A read-only connection cannot switch the journal mode
+                pragmas.pop('journal_mode', None)
+                pragmas['query_only'] = 'ON'
+            apply_sqlite_pragmas(engine, pragmas)
+
+    # Read caches keyed on the catalog version, so any committed write in any
+    # worker process invalidates them on the next lookup.
+    app.extensions['book_cache'] = LRUCache(app.config['BOOK_CACHE_SIZE'], app.config['BOOK_CACHE_TTL'])
+    app.extensions['catalog_versions'] = LRUCache(len(app.config['SHARD_DATABASE_URIS']) + 1,
+                                                  app.config['CATALOG_VERSION_TTL'])
+    app.extensions['search_cache'] = LRUCache(app.config['SEARCH_CACHE_SIZE'], app.config['SEARCH_CACHE_TTL'])
+    app.extensions['suggest_index'] = SuggestIndex(app.config['SUGGEST_MAX_BOOKS'], app.config['SUGGEST_MAX_KEY_LENGTH'],
+                                                   app.config['SUGGEST_TRIGRAMS'])
+    app.extensions['fragment_cache'] = LRUCache(app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL'])
+    app.extensions['compressed_cache'] = LRUCache(app.config['COMPRESS_CACHE_SIZE'], app.config['COMPRESS_CACHE_TTL'])
+    app.extensions['compression_stats'] = CompressionStats()
+    app.extensions['change_stream_slots'] = threading.BoundedSemaphore(app.config['CHANGES_STREAM_MAX_CLIENTS'])
+    app.extensions['job_runner'] = JobRunner(app.config['JOBS_MAX_WORKERS'], app.config['JOBS_MAX_QUEUED'])
+    app.extensions['shard_pool'] = shards.ShardPool(len(shard_uris)) if shard_uris else None
+
+    # Registered before the blueprint so the latency covers every other hook
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    app.teardown_request(finish_request_metrics)
+    app.before_request(start_request_trace)
+    app.after_request(finish_request_trace)
+    before_render_template.connect(start_template_span, app)
+    template_rendered.connect(end_template_span, app)
+    app.extensions['trace_exporter'] = TraceExporter(app.config['TRACE_FILE'])
+    init_logging(app)
+
+    app.register_blueprint(bp)
+    return app
+
+
 # Routes
-@app.route('/')
+@bp.route('/')
 def home():
-    return redirect(url_for('login'))
+    return redirect(url_for('.login'))
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         # Check if the request is JSON
@@ -88,21 +747,53 @@ def login():
                 return render_template('login.html', error="Incorrect password")
 
             session['user_id'] = user.id
-            return redirect(url_for('books'))
+            return redirect(url_for('.books'))
 
     # GET request: Show login page
     return render_template('login.html')
 
 
-@app.route('/books')
+@bp.route('/books')
 def books():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
-    books_list = Book.query.all()
-    return render_template('books.html', books=books_list)
+        return redirect(url_for('.login'))
 
+    try:
+        limit = parse_page_size(request.args.get('limit'), current_app.config['BOOKS_HTML_PAGE_SIZE'])
+        after = decode_cursor(request.args['after']) if request.args.get('after') else 0
+    except ValueError:
+        return redirect(url_for('.books'))
+
+    generation = current_catalog_version()
+    etag = list_etag('page', generation)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    # The rendered rows of a page only change with the catalog, so a hit
+    # skips both the query and the per-row rendering
+    fragment_cache = current_app.extensions['fragment_cache']
+    page = fragment_cache.get((after, limit), generation)
+    if page is None:
+        # Read the change seq before the rows: the page then subscribes from
+        # at or before its own state, and replaying a change is harmless
+        changes_since = latest_change_seq() if not shard_count() else None
+        rows = read_books(select_books().where(Book.id > after).order_by(Book.id).limit(limit + 1),
+                          key=list_sort_key('id'), limit=limit + 1)
+        book_row = get_template_attribute('_book_row.html', 'book_row')
+        next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+        page = (Markup('\n'.join(book_row(row._asdict()) for row in rows[:limit])), next_cursor, changes_since)
+        fragment_cache.set((after, limit), generation, page)
+
+    rows_html, next_cursor, changes_since = page
+    response = make_response(render_template('books.html', rows=rows_html, after=after, limit=limit,
+                                              next_cursor=next_cursor, changes_since=changes_since,
+                                              changes_poll_ms=int(current_app.config['CHANGES_POLL_INTERVAL'] * 1000)))
+    response.set_etag(etag)
+    return response
 
-@app.route('/logout')
+
+@bp.route('/logout')
 def logout():
     # Check if the user is logged in
     if 'user_id' not in session:
@@ -119,248 +810,1865 @@ def logout():
     return response
 
 
+# Pagination helpers
+def encode_cursor(book_id):
+    return base64.urlsafe_b64encode(str(book_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        book_id = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    if book_id < 0:
+        raise ValueError('Invalid cursor')
+    return book_id
+
+
+def parse_page_size(value, default=None):
+    if value is None:
+        return default or current_app.config['BOOKS_PAGE_SIZE']
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('Limit must be a positive integer')
+    if limit < 1:
+        raise ValueError('Limit must be a positive integer')
+    return min(limit, current_app.config['BOOKS_MAX_PAGE_SIZE'])
+
+
+# Serialization: list endpoints select these columns as plain row tuples
+# instead of hydrating Book objects, and encode them in one pass
+BOOK_COLUMNS = ('id', 'title', 'author', 'isbn')
+
+
+def select_books():
+    return db.select(*(getattr(Book, column) for column in BOOK_COLUMNS))
+
+
+def parse_format():
+    format_name = request.args.get('format', 'records')
+    if format_name not in FORMATS:
+        raise ValueError(f"Format must be one of: {', '.join(FORMATS)}")
+    return format_name
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def books_response(rows, format_name='records', status=200):
+    return json_response(FORMATS[format_name](BOOK_COLUMNS, rows), status)
+
+
+def wants_stream():
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+
+def stream_books(ndjson, query, key=None, descending=False):
+    """Yield the rows of `query` in fixed-size batches read from a server-side cursor (one per shard)."""
+    batch_size = current_app.config['BOOKS_STREAM_BATCH_SIZE']
+    with ExitStack() as resources:
+        if shard_count():
+            connections = [resources.enter_context(db.engines[f'shard{shard}'].connect())
+                           for shard in range(shard_count())]
+            results = stream_results(resources, connections, query, batch_size)
+            batches = shards.merge_batches(results, key, batch_size, descending)
+        else:
+            batches = db.session.execute(query.execution_options(stream_results=True, yield_per=batch_size)).partitions()
+        yield from encode_book_batches(ndjson, batches)
+
+
+def stream_results(resources, connections, query, batch_size):
+    """Run `query` on every connection with a server-side cursor, closed along with `resources`."""
+    query = query.execution_options(stream_results=True, yield_per=batch_size)
+    return [resources.enter_context(connection.execute(query)) for connection in connections]
+
+
+def encode_book_batches(ndjson, batches):
+    first = True
+    if not ndjson:
+        yield b'['
+    for rows in batches:
+        if ndjson:
+            yield b''.join(dumps(to_record(BOOK_COLUMNS, row)) + b'\n' for row in rows)
+        else:
+            # Encode the batch as one array and drop its brackets
+            yield (b'' if first else b',') + dumps(to_records(BOOK_COLUMNS, rows))[1:-1]
+        first = False
+    if not ndjson:
+        yield b']'
+
+
+# Catalog versioning and conditional requests
+def current_catalog_version():
+    if shard_count() and shards.current_shard.get() is None:
+        # Every write bumps its own shard's version, so the sum changes whenever any shard does
+        total = 0
+        for shard in range(shard_count()):
+            with shard_scope(shard):
+                total += current_catalog_version()
+        return total
+    return db.session.execute(db.select(CatalogState.version).where(CatalogState.id == 1)).scalar() or 0
+
+
+def bump_catalog_version():
+    db.session.execute(
+        db.update(CatalogState).where(CatalogState.id == 1).values(version=CatalogState.version + 1)
+    )
+    db.session.info['catalog_bumped'] = True
+
+
+def cached_catalog_version():
+    """current_catalog_version, re-read at most every CATALOG_VERSION_TTL seconds.
+
+    For lookups cheaper than the version query itself.  This worker's own
+    writes take effect at once (see forget_catalog_versions); other workers'
+    within the TTL.
+    """
+    versions = current_app.extensions['catalog_versions']
+    key = shards.current_shard.get()
+    version = versions.get(key, None)
+    if version is None:
+        version = current_catalog_version()
+        versions.set(key, None, version)
+    return version
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def forget_catalog_versions(session):
+    if session.info.pop('catalog_bumped', False) and has_app_context():
+        current_app.extensions['catalog_versions'].clear()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def discard_catalog_bump(session):
+    session.info.pop('catalog_bumped', None)
+
+
+def list_etag(prefix, version):
+    args = urlencode(sorted(request.args.items(multi=True)))
+    accept = request.headers.get('Accept', '')
+    digest = hashlib.sha1(f'{args}|{accept}'.encode()).hexdigest()[:16]
+    return f'{prefix}-{version}-{digest}'
+
+
+def book_etag(book_id, version):
+    return f'book-{book_id}-{version}'
+
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds `etag`, else None."""
+    # Weak comparison, so the W/ form sent with compressed bodies matches too
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        # A 304 carries the ETag its 200 would: compress_response weakens the tag of the bodies it
+        # encodes, which are the ones the client holds in the W/ form
+        response.set_etag(etag, weak=not request.if_none_match.contains(etag))
+        response.vary.add('Accept-Encoding')
+        return response
+    return None
+
+
+# Filtering and sorting for GET /api/books.  Only combinations that one of
+# Book's composite indexes serves in order are accepted: the query seeks to
+# the filter values and reads rows already sorted, so a page costs the same
+# however large the catalog is.  Anything else would scan and sort the whole
+# table and is rejected with the combinations that are supported.
+BOOK_SORT_KEYS = ('id', 'title', 'author', 'created_at')
+BOOK_LIST_INDEXES = {
+    (frozenset(), 'id'): 'PRIMARY KEY',
+    (frozenset(), 'title'): 'ix_book_title_id',
+    (frozenset(), 'author'): 'ix_book_author_id',
+    (frozenset(), 'created_at'): 'ix_book_created_at_id',
+    (frozenset({'author'}), 'id'): 'ix_book_author_id',
+    (frozenset({'author'}), 'author'): 'ix_book_author_id',
+    (frozenset({'author'}), 'title'): 'ix_book_author_title_id',
+    (frozenset({'author'}), 'created_at'): 'ix_book_author_created_at_id',
+    (frozenset({'created_at'}), 'created_at'): 'ix_book_created_at_id',
+    (frozenset({'author', 'created_at'}), 'created_at'): 'ix_book_author_created_at_id',
+}
+
+
+def parse_timestamp(value, name):
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 date or timestamp')
+    # created_at is stored as naive UTC
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def parse_book_list_args(args):
+    """Return (filters, sort, descending) for a list request, or raise ValueError."""
+    filters = {}
+    if args.get('author', '').strip():
+        filters['author'] = args['author'].strip()
+    for name in ('created_after', 'created_before'):
+        if args.get(name):
+            filters[name] = parse_timestamp(args[name], name)
+
+    sort = args.get('sort', 'id')
+    if sort not in BOOK_SORT_KEYS:
+        raise ValueError(f"Sort must be one of: {', '.join(BOOK_SORT_KEYS)}")
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('Order must be asc or desc')
+
+    filtered = frozenset('created_at' if name.startswith('created_') else name for name in filters)
+    if (filtered, sort) not in BOOK_LIST_INDEXES:
+        supported = [key for (fields, key) in BOOK_LIST_INDEXES if fields == filtered]
+        raise ValueError(f"Filtering on {' and '.join(sorted(filtered))} requires sort to be one of: "
+                         f"{', '.join(supported)}")
+    return filters, sort, order == 'desc'
+
+
+def encode_sort_cursor(value, book_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, book_id]).encode()).decode().rstrip('=')
+
+
+def decode_sort_cursor(cursor, sort):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        value, book_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if sort == 'created_at':
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(value, (str, datetime)) or not is_book_id(book_id):
+        raise ValueError('Invalid cursor')
+    return value, book_id
+
+
+def list_sort_key(sort):
+    """The (sort key, id) order of book_list_query's rows, for merging the rows of several shards."""
+    if sort == 'id':
+        return lambda row: row.id
+    return lambda row: (getattr(row, sort), row.id)
+
+
+def book_list_query(filters, sort, descending, after=None):
+    """Select the filtered books in (sort key, id) order, starting after the `after` key if given."""
+    query = select_books()
+    if sort == 'created_at':
+        # Selected for the next-page cursor; the serializers only emit BOOK_COLUMNS
+        query = query.add_columns(Book.created_at)
+    if 'author' in filters:
+        query = query.where(Book.author == filters['author'])
+    if 'created_after' in filters:
+        query = query.where(Book.created_at > filters['created_after'])
+    if 'created_before' in filters:
+        query = query.where(Book.created_at < filters['created_before'])
+
+    key = [Book.id] if sort == 'id' else [getattr(Book, sort), Book.id]
+    if after is not None:
+        position = key[0] if sort == 'id' else db.tuple_(*key)
+        query = query.where(position < after if descending else position > after)
+    return query.order_by(*(column.desc() if descending else column for column in key))
+
+
 # API Routes
-@app.route('/api/books', methods=['GET'])
+@bp.route('/api/books', methods=['GET'])
 def get_books():
-    books = Book.query.all()
-    return jsonify([{
-        'id': book.id,
-        'title': book.title,
-        'author': book.author,
-        'isbn': book.isbn
-    } for book in books])
+    # Answer unchanged polls from the catalog version alone
+    etag = list_etag('books', current_catalog_version())
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
+    try:
+        format_name = parse_format()
+        filters, sort, descending = parse_book_list_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if wants_stream():
+        if format_name != 'records':
+            return jsonify({'error': 'Only the records format can be streamed'}), 400
+        ndjson = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == \
+            'application/x-ndjson'
+        mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+        query = book_list_query(filters, sort, descending)
+        response = Response(stream_with_context(stream_books(ndjson, query, list_sort_key(sort), descending)),
+                            mimetype=mimetype)
+        response.set_etag(etag)
+        return response
 
-@app.route('/api/books/search', methods=['GET'])
-def search_books():
-    query = request.args.get('q', '')
-    field = request.args.get('field', 'all')
+    try:
+        limit = parse_page_size(request.args.get('limit'))
+        after = None
+        if request.args.get('after'):
+            after = decode_cursor(request.args['after']) if sort == 'id' else \
+                decode_sort_cursor(request.args['after'], sort)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Keyset pagination: seek past the cursor on the index that serves this
+    # filter and sort, so a deep page costs the same as the first one.  One
+    # extra row tells us whether there is a next page.
+    books = read_books(book_list_query(filters, sort, descending, after).limit(limit + 1),
+                       list_sort_key(sort), descending, limit + 1)
+    has_next = len(books) > limit
+    books = books[:limit]
+
+    response = books_response(books, format_name)
+    if has_next:
+        last = books[-1]
+        cursor = encode_cursor(last.id) if sort == 'id' else encode_sort_cursor(getattr(last, sort), last.id)
+        next_args = {name: value for name, value in request.args.items() if name not in ('limit', 'after')}
+        next_url = url_for('.get_books', limit=limit, after=cursor, _external=True, **next_args)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    response.set_etag(etag)
+    return response
 
-    if not query:
-        return jsonify({'error': 'Search query is required'}), 400
 
-    if field not in ['all', 'title', 'author', 'isbn']:
-        return jsonify({'error': 'Invalid search field'}), 400
+def fts_match_expression(query, field):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    expression = ' '.join(f'"{term}"*' for term in terms)
+    if field != 'all':
+        expression = f'{field} : ({expression})'
+    return expression
+
+
+def search_books_fts(query, field, limit, connection=None):
+    expression = fts_match_expression(query, field)
+    if expression is None:
+        return []
+    # rank is selected so that the results of several shards can be merged
+    return (connection or db.session).execute(db.text(
+        "SELECT book.id, book.title, book.author, book.isbn, book_fts.rank "
+        "FROM book_fts JOIN book ON book.id = book_fts.rowid "
+        "WHERE book_fts MATCH :expression "
+        "ORDER BY book_fts.rank "
+        "LIMIT :limit"
+    ), {'expression': expression, 'limit': limit}).all()
 
-    books_query = Book.query
+
+def search_books_like(query, field, limit):
+    books_query = select_books()
 
     if field == 'all':
-        books = books_query.filter(
+        books_query = books_query.filter(
             (Book.title.ilike(f'%{query}%')) |
             (Book.author.ilike(f'%{query}%')) |
             (Book.isbn.ilike(f'%{query}%'))
-        ).all()
+        )
     elif field == 'title':
-        books = books_query.filter(Book.title.ilike(f'%{query}%')).all()
+        books_query = books_query.filter(Book.title.ilike(f'%{query}%'))
     elif field == 'author':
-        books = books_query.filter(Book.author.ilike(f'%{query}%')).all()
+        books_query = books_query.filter(Book.author.ilike(f'%{query}%'))
     elif field == 'isbn':
-        books = books_query.filter(Book.isbn.ilike(f'%{query}%')).all()
+        books_query = books_query.filter(Book.isbn.ilike(f'%{query}%'))
+
+    return db.session.execute(books_query.order_by(Book.id).limit(limit)).all()
+
+
+@bp.route('/api/books/search', methods=['GET'])
+def search_books():
+    query = request.args.get('q', '')
+    field = request.args.get('field', 'all')
 
-    # **Fix: Return error if no books are found**
-    if not books:
-        return jsonify({'error': 'No books found matching the search criteria'}), 400
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
 
-    return jsonify([{
-        'id': book.id,
-        'title': book.title,
-        'author': book.author,
-        'isbn': book.isbn
-    } for book in books])
+    if field not in ['all', 'title', 'author', 'isbn']:
+        return jsonify({'error': 'Invalid search field'}), 400
 
+    try:
+        limit = parse_page_size(request.args.get('limit'), current_app.config['BOOKS_SEARCH_LIMIT'])
+        format_name = parse_format()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    generation = current_catalog_version()
+    etag = list_etag('search', generation)
+    not_changed = not_modified(etag)
+    if not_changed:
+        return not_changed
+
+    key = (query, field, limit, format_name)
+    search_cache = current_app.extensions['search_cache']
+    cached = search_cache.get(key, generation)
+    if cached is None:
+        if shard_count():
+            # bm25 ranks come from each shard's own statistics, which is close enough for ordering
+            books = shards.merge(scatter(lambda connection: search_books_fts(query, field, limit, connection)),
+                                 lambda row: row.rank, limit=limit)
+        elif fts_enabled():
+            books = search_books_fts(query, field, limit)
+        else:
+            books = search_books_like(query, field, limit)
+
+        # **Fix: Return error if no books are found**
+        if not books:
+            response, status = json_response({'error': 'No books found matching the search criteria'}), 400
+        else:
+            response, status = books_response(books, format_name), 200
+        cached = (response.get_data(), status)
+        search_cache.set(key, generation, cached)
 
-@app.route('/api/books/<int:book_id>', methods=['GET'])
+    body, status = cached
+    response = Response(body, status=status, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
+@bp.route('/api/books/<int:book_id>', methods=['GET'])
+@with_book_shard
 def get_book(book_id):
-    book = Book.query.get(book_id)
+    book_cache = current_app.extensions['book_cache']
+    # A hit makes no query at all; a write in another worker shows within CATALOG_VERSION_TTL
+    generation = cached_catalog_version()
+    book = book_cache.get(book_id, generation)
     if book is None:
+        row = db.session.execute(
+            db.select(Book.id, Book.title, Book.author, Book.isbn, Book.version).where(Book.id == book_id)
+        ).first()
+        if row is None:
+            abort(404)
+        book = row._asdict()
+        book_cache.set(book_id, generation, book)
+
+    etag = book_etag(book['id'], book['version'])
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    response = json_response({column: book[column] for column in BOOK_COLUMNS})
+    response.set_etag(etag)
+    return response
+
+
+@bp.route('/api/books/isbn/<isbn>', methods=['GET'])
+def get_book_by_isbn(isbn):
+    # ISBN-10 and ISBN-13 forms of a book share one key, so this is a single unique-index probe
+    key = isbn_key(isbn)
+    query = db.select(Book.id, Book.title, Book.author, Book.isbn, Book.version).where(Book.isbn13 == key)
+    with shard_scope(isbn_shard(key)):
+        row = db.session.execute(query).first()
+        claimed_by = None
+        if row is None and shard_count():
+            claimed_by = db.session.execute(db.select(isbn_claim.c.book_id).where(isbn_claim.c.isbn13 == key)).scalar()
+    if claimed_by is not None:
+        # The book kept its shard when its ISBN changed to this one
+        with shard_scope(book_shard(claimed_by)):
+            row = db.session.execute(query.where(Book.id == claimed_by)).first()
+    if row is None:
         abort(404)
-    return jsonify({
-        'id': book.id,
-        'title': book.title,
-        'author': book.author,
-        'isbn': book.isbn
-    }), 200
+
+    etag = book_etag(row.id, row.version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    response = json_response(to_record(BOOK_COLUMNS, row))
+    response.set_etag(etag)
+    return response
+
+
+# Catalog export
+EXPORT_COLUMNS = BOOK_COLUMNS + ('created_at',)
+EXPORT_TYPES = ('int64', 'string', 'string', 'string', 'timestamp[us]')
+
+
+def select_export():
+    # created_at as its stored text in ISO form: far cheaper than parsing every value into a datetime
+    created_at = db.func.replace(db.cast(Book.created_at, db.String), ' ', 'T')
+    return db.select(Book.id, Book.title, Book.author, Book.isbn, created_at).order_by(Book.id)
+
+
+def catalog_engines():
+    """The engines to read the whole catalog from: every shard, or the read replica or main database."""
+    if shard_count():
+        return [db.engines[f'shard{shard}'] for shard in range(shard_count())]
+    return [db.engines['read'] if 'read' in db.engines else db.engine]
+
+
+@contextmanager
+def snapshot_connection(engine):
+    """A connection whose statements all read one snapshot of the database."""
+    if engine.dialect.name == 'sqlite':
+        # pysqlite starts no transaction for SELECTs, so each would see its own snapshot
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('BEGIN')
+            try:
+                yield connection
+            finally:
+                connection.exec_driver_sql('ROLLBACK')
+    else:
+        with engine.connect().execution_options(isolation_level='REPEATABLE READ') as connection, \
+                connection.begin():
+            yield connection
+
+
+@bp.route('/api/books/export', methods=['GET'])
+def export_books():
+    format_name = request.args.get('format', 'ndjson')
+    formats = export.available_formats()
+    if format_name not in formats:
+        return jsonify({'error': f"Format must be one of: {', '.join(formats)}"}), 400
+
+    # With sharded storage, one snapshot per shard, merged in id order
+    engines = catalog_engines()
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    # Closed once the response has been sent or abandoned, whether or not the body was read
+    resources = ExitStack()
+    try:
+        connections = [resources.enter_context(snapshot_connection(engine)) for engine in engines]
+        # Read in the export's snapshot: the change feed after this seq carries on from the export
+        change_seq = None
+        if not shard_count():
+            change_seq = connections[0].execute(db.select(db.func.max(BookChange.seq))).scalar() or 0
+        results = stream_results(resources, connections, select_export(), batch_size)
+    except Exception:
+        resources.close()
+        raise
+
+    if len(results) == 1:
+        batches = results[0].partitions()
+    else:
+        batches = shards.merge_batches(results, lambda row: row[0], batch_size)
+    body = export.encode(format_name, EXPORT_COLUMNS, EXPORT_TYPES, batches)
+    response = Response(body, mimetype=export.MIMETYPES[format_name])
+    if change_seq is None:
+        response.headers['Content-Disposition'] = f'attachment; filename="books.{format_name}"'
+    else:
+        response.headers['Content-Disposition'] = f'attachment; filename="books-{change_seq}.{format_name}"'
+        response.headers['X-Change-Seq'] = str(change_seq)
+    response.call_on_close(resources.close)
+    return response
+
+
+# Catalog statistics
+def top_authors(connections, limit):
+    """The `limit` (author, books) pairs with the most books over the databases of `connections`.
+
+    With one database this reads `limit` entries of its index.  With shards an
+    author's books are spread over all of them, so each shard's leaders are
+    summed with the author's counts in the other shards.  An author missing
+    from a shard's first `fetch` rows has at most that shard's last count there,
+    so once the limit-th total is above the sum of those bounds no unseen author
+    can overtake it; otherwise each shard is read twice as deep.
+    """
+    leaders = db.select(book_author_stats.c.author, book_author_stats.c.books).order_by(
+        book_author_stats.c.books.desc(), book_author_stats.c.author)
+    if len(connections) == 1:
+        return connections[0].execute(leaders.limit(limit)).all()
+
+    fetch = limit
+    while True:
+        tops = [connection.execute(leaders.limit(fetch)).all() for connection in connections]
+        authors = {author for rows in tops for author, _ in rows}
+        totals = {}
+        for connection in connections:
+            for author, books in connection.execute(leaders.where(book_author_stats.c.author.in_(authors))):
+                totals[author] = totals.get(author, 0) + books
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        bound = sum(rows[-1].books for rows in tops if len(rows) == fetch)
+        if bound == 0 or (len(ranked) == limit and ranked[-1][1] > bound):
+            return ranked
+        fetch *= 2
+
+
+def read_stats(connections, limit):
+    total = 0
+    days = {}
+    for connection in connections:
+        total += connection.execute(db.select(book_stats.c.books).where(book_stats.c.id == 1)).scalar() or 0
+        for day, books in connection.execute(db.select(book_day_stats.c.day, book_day_stats.c.books)):
+            days[day] = days.get(day, 0) + books
+    return {
+        'total': total,
+        'authors': to_records(('author', 'books'), top_authors(connections, limit)),
+        'days': to_records(('day', 'books'), sorted(days.items())),
+    }
+
+
+@bp.route('/api/books/stats', methods=['GET'])
+def get_stats():
+    if not fts_enabled():
+        return jsonify({'error': 'Catalog statistics need SQLite'}), 501
+    try:
+        limit = min(parse_page_size(request.args.get('limit'), current_app.config['STATS_TOP_AUTHORS']),
+                    current_app.config['STATS_MAX_TOP_AUTHORS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Read before the statistics, so a write between the two only makes the ETag look stale
+    etag = list_etag('stats', current_catalog_version())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    # One snapshot per database, so the total, authors and days describe the same books
+    with ExitStack() as stack:
+        connections = [stack.enter_context(snapshot_connection(engine)) for engine in catalog_engines()]
+        stats = read_stats(connections, limit)
+    response = json_response(stats)
+    response.set_etag(etag)
+    return response
 
 
+@bp.cli.command('reconcile-stats')
+@click.option('--check', is_flag=True, help='Only report drift, without rebuilding.')
+def reconcile_stats_command(check):
+    """Recount the catalog statistics from the books and report any drift; exits 1 on drift with --check."""
+    if not fts_enabled():
+        raise click.ClickException('Catalog statistics need SQLite')
+    if shard_count():
+        engines = {f'shard{shard}': db.engines[f'shard{shard}'] for shard in range(shard_count())}
+    else:
+        engines = {'main': db.engine}
+    reports = {name: reconcile_stats(engine, rebuild=not check) for name, engine in engines.items()}
+    click.echo(json.dumps(reports, indent=2))
+    key = 'drift' if check else 'drift_after_rebuild'
+    if any(report[key] for report in reports.values()):
+        sys.exit(1)
+
 import re
 
 
-@app.route('/api/books', methods=['POST'])
+# Book validation rules shared by the single and bulk write endpoints
+BOOK_FIELDS = ['title', 'author', 'isbn']
+TITLE_PATTERN = re.compile(r"^[a-zA-Z0-9\s]*$")
+DIGIT_PATTERN = re.compile(r'\d')
+ISBN_PATTERN = re.compile(r'^\d{10}(\d{3})?$')
+
+
+def missing_book_fields(data):
+    return [field for field in BOOK_FIELDS if field not in data or not data[field].strip()]
+
+
+def book_validation_error(title, author, isbn, isbn13):
+    # Title, author, and ISBN must not be empty or whitespace only
+    if not title or not author or not isbn:
+        return 'Title, Author, or ISBN cannot be empty or whitespace only.'
+
+    # Check for special characters in title
+    if not TITLE_PATTERN.match(title):  # Only alphanumeric and space allowed
+        return 'Title contains special characters, only alphanumeric characters and spaces are allowed.'
+
+    # Check if author contains numbers
+    if DIGIT_PATTERN.search(author):  # If any digit is found in author name
+        return 'Author name cannot contain numbers.'
+
+    return isbn_validation_error(isbn, isbn13)
+
+
+def isbn_validation_error(isbn, isbn13):
+    # `isbn13` is to_isbn13(isbn), which callers compute once and keep as the book's key
+    # Validate ISBN (should only contain digits and be 10 or 13 characters long)
+    if not ISBN_PATTERN.match(isbn):  # Matches 10 or 13 digit ISBN
+        return 'ISBN must be numeric and either 10 or 13 digits long.'
+
+    # The last digit is a checksum over the others
+    if isbn13 is None:
+        return 'ISBN check digit is invalid.'
+
+    return None
+
+
+def insert_book(title, author, isbn):
+    """Insert a book and return its id, or None if its ISBN (in either form) is already taken.
+
+    The unique indexes decide, so two concurrent requests for one ISBN cannot
+    both pass a check made before the INSERT.
+    """
+    values = {'title': title, 'author': author, 'isbn': isbn, 'isbn13': isbn_key(isbn)}
+    if fts_enabled():
+        # No row back from ON CONFLICT DO NOTHING means a unique index already holds the ISBN
+        return db.session.execute(
+            sqlite_insert(Book).values(**values).on_conflict_do_nothing().returning(Book.id)
+        ).scalar()
+    try:
+        with db.session.begin_nested():
+            book = Book(**values)
+            db.session.add(book)
+        return book.id
+    except IntegrityError:
+        return None
+
+
+@bp.route('/api/books', methods=['POST'])
 def add_book():
     data = request.get_json()
 
-    required_fields = ['title', 'author', 'isbn']
-    missing_fields = [field for field in required_fields if field not in data or not data[field].strip()]
+    missing_fields = missing_book_fields(data)
 
     if missing_fields:
         return jsonify({'error': f"Missing or empty required fields: {', '.join(missing_fields)}"}), 400
 
-    # Check for duplicate ISBN
-    existing_book = Book.query.filter_by(isbn=data['isbn']).first()
-    if existing_book:
-        return jsonify({'error': 'Duplicate book detected! The book is already in the list.'}), 409
-
     try:
-        # Title, author, and ISBN must not be empty or whitespace only
         title = data['title'].strip()
         author = data['author'].strip()
         isbn = data['isbn'].strip()
 
-        if not title or not author or not isbn:
-            return jsonify({'error': 'Title, Author, or ISBN cannot be empty or whitespace only.'}), 400
-
-        # Check for special characters in title
-        if not re.match("^[a-zA-Z0-9\s]*$", title):  # Only alphanumeric and space allowed
-            return jsonify({
-                'error': 'Title contains special characters, only alphanumeric characters and spaces are allowed.'}), 400
+        key = to_isbn13(isbn)
+        error = book_validation_error(title, author, isbn, key)
+        if error:
+            return jsonify({'error': error}), 400
 
-        # Check if author contains numbers
-        if re.search(r'\d', author):  # If any digit is found in author name
-            return jsonify({'error': 'Author name cannot contain numbers.'}), 400
+        with shard_scope(isbn_shard(key)):
+            book_id = insert_book(title, author, isbn)
+            if book_id is None:
+                db.session.rollback()
+                return jsonify({'error': 'Duplicate book detected! The book is already in the list.'}), 409
 
-        # Validate ISBN (should only contain digits and be 10 or 13 characters long)
-        if not re.match(r'^\d{10}(\d{3})?$', isbn):  # Matches 10 or 13 digit ISBN
-            return jsonify({'error': 'ISBN must be numeric and either 10 or 13 digits long.'}), 400
+            record_changes('insert', [{'book_id': book_id, 'title': title, 'author': author, 'isbn': isbn,
+                                       'version': 1}])
+            bump_catalog_version()
+            db.session.commit()
+        return json_response(to_record(BOOK_COLUMNS, (book_id, title, author, isbn)), 201)
 
-        new_book = Book(
-            title=title,
-            author=author,
-            isbn=isbn
-        )
-        db.session.add(new_book)
-        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Error adding book: %s", e)
+        return jsonify({'error': 'An unexpected error occurred'}), 500
 
-        return jsonify({
-            'id': new_book.id,
-            'title': new_book.title,
-            'author': new_book.author,
-            'isbn': new_book.isbn
-        }), 201
 
+class RawStream(io.RawIOBase):
+    """A file object over anything with read(), such as gunicorn's request body, for io.TextIOWrapper."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_bulk_rows(stream, content_type):
+    """Yield one record per line of an NDJSON or CSV body without buffering it."""
+    if not isinstance(stream, io.IOBase):
+        stream = io.BufferedReader(RawStream(stream))
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if content_type == 'text/csv':
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def insert_book_batch(books):
+    """Insert `books`, skipping any whose ISBN is taken, and return the canonical ISBNs inserted.
+
+    The unique indexes decide, as in insert_book, so a book committed by
+    another request while the batch is being inserted only skips its row.
+    """
+    created_at = datetime.utcnow()
+    if not fts_enabled():
+        last_id = db.session.execute(db.select(db.func.coalesce(db.func.max(Book.id), 0))).scalar()
+        for book in books:
+            book['created_at'] = created_at
+        try:
+            # Core insert with a parameter list runs as a single executemany
+            with db.session.begin_nested():
+                db.session.execute(Book.__table__.insert(), books)
+            inserted = {book['isbn13'] for book in books}
+        except IntegrityError:
+            inserted = set()
+            for book in books:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(Book.__table__.insert(), book)
+                    inserted.add(book['isbn13'])
+                except IntegrityError:
+                    pass
+        if inserted:
+            bump_catalog_version()
+            record_inserts_after(last_id)
+        db.session.commit()
+        return inserted
+
+    # SQLite fast path: bind plain tuples straight to the driver's executemany
+    # and index, count and log the whole batch with one INSERT ... SELECT each.
+    connection = db.session.connection()
+    # The first write takes the write lock, so no other book can get an id
+    # between reading the highest id and inserting: the ids above it are this batch
+    connection.exec_driver_sql("UPDATE book_fts_control SET deferred = 1 WHERE id = 1")
+    last_id = connection.exec_driver_sql("SELECT coalesce(max(id), 0) FROM book").scalar()
+    timestamp = created_at.strftime('%Y-%m-%d %H:%M:%S.%f')
+    connection.exec_driver_sql(
+        "INSERT INTO book (title, author, isbn, isbn13, created_at) VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+        [(book['title'], book['author'], book['isbn'], book['isbn13'], timestamp) for book in books]
+    )
+    inserted = set(connection.exec_driver_sql("SELECT isbn13 FROM book WHERE id > ?", (last_id,)).scalars())
+    if inserted:
+        connection.exec_driver_sql(
+            "INSERT INTO book_fts(rowid, title, author, isbn) "
+            "SELECT id, title, author, isbn FROM book WHERE id > ?", (last_id,)
+        )
+        for statement in BOOK_STATS_APPEND:
+            connection.exec_driver_sql(statement, (last_id,))
+        record_inserts_after(last_id)
+        bump_catalog_version()
+    connection.exec_driver_sql("UPDATE book_fts_control SET deferred = 0 WHERE id = 1")
+    db.session.commit()
+    return inserted
+
+
+def import_book_batch(batch, results):
+    """Insert one batch of validated rows, which carry their isbn13 key, rejecting ISBNs that already exist."""
+    books = {}
+    for _, book in batch:
+        # The first row with an ISBN is the one inserted; later ones in the batch are duplicates
+        books.setdefault(book['isbn13'], book)
+    inserted = insert_book_batch(list(books.values())) if books else set()
+
+    accepted = 0
+    for row, book in batch:
+        if book['isbn13'] in inserted and books[book['isbn13']] is book:
+            accepted += 1
+            results.append({'row': row, 'isbn': book['isbn'], 'status': 201})
+        else:
+            results.append({'row': row, 'isbn': book['isbn'], 'status': 409,
+                            'error': 'Duplicate book detected! The book is already in the list.'})
+    return accepted
+
+
+def import_batch_by_shard(batch, results):
+    """import_book_batch, for each shard's part of the batch in turn with sharded storage."""
+    if not shard_count():
+        return import_book_batch(batch, results)
+    parts = {}
+    for row, book in batch:
+        parts.setdefault(isbn_shard(book['isbn13']), []).append((row, book))
+    accepted = 0
+    for shard, part in parts.items():
+        with shard_scope(shard):
+            accepted += import_book_batch(part, results)
+    return accepted
+
+
+def import_books(stream, content_type, results, after_batch=None):
+    """Validate and insert the rows of a bulk body batch by batch, returning how many were accepted.
+
+    A result per row is appended to `results`; `after_batch(rows_read, accepted, final)`
+    runs after every committed batch, and once more with `final` set at the end.
+    """
+    batch_size = current_app.config['BOOKS_BULK_BATCH_SIZE']
+    batch = []
+    accepted = 0
+    row = 0
+
+    for row, data in enumerate(read_bulk_rows(stream, content_type), start=1):
+        if not isinstance(data, dict) or any(not isinstance(data.get(field, ''), str) for field in BOOK_FIELDS):
+            results.append({'row': row, 'status': 400, 'error': 'Invalid row format'})
+            continue
+
+        missing_fields = missing_book_fields(data)
+        if missing_fields:
+            results.append({'row': row, 'status': 400,
+                            'error': f"Missing or empty required fields: {', '.join(missing_fields)}"})
+            continue
+
+        book = {field: data[field].strip() for field in BOOK_FIELDS}
+        # Computed once here; a valid ISBN's ISBN-13 form is its key for the insert and shard routing
+        book['isbn13'] = to_isbn13(book['isbn'])
+        error = book_validation_error(book['title'], book['author'], book['isbn'], book['isbn13'])
+        if error:
+            results.append({'row': row, 'isbn': book['isbn'], 'status': 400, 'error': error})
+            continue
+
+        batch.append((row, book))
+        if len(batch) >= batch_size:
+            accepted += import_batch_by_shard(batch, results)
+            batch = []
+            if after_batch:
+                after_batch(row, accepted)
+
+    if batch:
+        accepted += import_batch_by_shard(batch, results)
+    if after_batch:
+        after_batch(row, accepted, final=True)
+    return accepted
+
+
+@bp.route('/api/books/bulk', methods=['POST'])
+def add_books_bulk():
+    content_type = request.mimetype
+    if content_type not in ('application/x-ndjson', 'text/csv'):
+        return jsonify({'error': 'Content-Type must be application/x-ndjson or text/csv'}), 400
+
+    if request.args.get('async', '').lower() in ('1', 'true'):
+        return start_import_job(content_type)
+
+    results = []
+    try:
+        accepted = import_books(request.stream, content_type, results)
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'error': 'Request body must be UTF-8 encoded'}), 400
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        current_app.logger.error("Error importing books: %s", e)
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+    results.sort(key=lambda result: result['row'])
+    return jsonify({
+        'accepted': accepted,
+        'rejected': len(results) - accepted,
+        'rows': results
+    }), 200
+
+
+def book_conflicts(book_id, title, author, isbn):
+    """Whether another book has the title, the author or the ISBN, as three labelled columns."""
+    other = db.aliased(Book)
 
+    def taken(column, value):
+        return db.exists().where(getattr(other, column) == value, other.id != book_id)
 
-@app.route('/api/books/<int:book_id>', methods=['PUT'])
+    key = isbn_key(isbn) if isbn is not None else None
+    isbn_taken = taken('isbn13', key)
+    if shard_count():
+        isbn_taken = isbn_taken | db.exists().where(isbn_claim.c.isbn13 == key, isbn_claim.c.book_id != book_id)
+    return (taken('title', title).label('title_taken'), taken('author', author).label('author_taken'),
+            isbn_taken.label('isbn_taken'))
+
+
+def load_book_for_update(book_id, title, author, isbn):
+    """Fetch the target's version, ISBN and ISBN key and all three conflict flags in one query.
+
+    With sharded storage the flags are checked on every shard, in parallel.
+    """
+    conflicts = book_conflicts(book_id, title, author, isbn)
+    book = db.session.execute(db.select(Book.version, Book.isbn, Book.isbn13, *conflicts).where(Book.id == book_id)).first()
+    if book is None or not shard_count():
+        return book
+    flags = scatter(lambda connection: connection.execute(db.select(*conflicts)).one())
+    return SimpleNamespace(**dict(book._mapping, **{
+        name: any(getattr(shard_flags, name) for shard_flags in flags)
+        for name in ('title_taken', 'author_taken', 'isbn_taken')
+    }))
+
+
+@bp.route('/api/books/<int:book_id>', methods=['PUT'])
+@with_book_shard
 def update_book(book_id):
-    app.logger.info(f"Received PUT request for book ID {book_id}")
-    app.logger.info(f"Request headers: {dict(request.headers)}")
+    current_app.logger.info("Received PUT request for book ID %s", book_id)
+    if current_app.logger.isEnabledFor(logging.DEBUG):
+        current_app.logger.debug("Request headers: %s",
+                                 Truncated(dict(request.headers), current_app.config['LOG_MAX_FIELD_SIZE']))
 
     # Ensure we have JSON data
     if not request.is_json:
-        app.logger.error("Request does not contain JSON data")
+        current_app.logger.error("Request does not contain JSON data")
         return jsonify({'error': 'Content-Type must be application/json'}), 400
 
     # Parse the incoming JSON data
     try:
         data = request.get_json()
-        app.logger.info(f"Request data: {data}")
+        current_app.logger.debug("Request data: %s", Truncated(data, current_app.config['LOG_MAX_FIELD_SIZE']))
     except Exception as e:
-        app.logger.error(f"Error parsing JSON data: {e}")
+        current_app.logger.error("Error parsing JSON data: %s", e)
         return jsonify({'error': 'Invalid JSON format'}), 400
 
     # Simulate an internal server error for testing
     if data.get('title', '').lower() == 'trigger_error':
-        app.logger.error("Intentional internal server error triggered")
+        current_app.logger.error("Intentional internal server error triggered")
         return jsonify({"error": "This is a simulated internal server error"}), 500
 
-    # Fetch the book by ID
-    book = Book.query.get(book_id)
+    title, author, isbn = (data[field].strip() if isinstance(data.get(field), str) else None
+                           for field in BOOK_FIELDS)
+
+    # Fetch the book and check for conflicts with other books in a single round trip
+    book = load_book_for_update(book_id, title, author, isbn)
     if not book:
-        app.logger.error(f"Book with ID {book_id} not found")
+        current_app.logger.error("Book with ID %s not found", book_id)
         return jsonify({'error': 'Book not found'}), 404
 
     # Validate required fields (ensure they exist in request data)
-    required_fields = ['title', 'author', 'isbn']
-    missing_fields = [field for field in required_fields if field not in data]
+    missing_fields = [field for field in BOOK_FIELDS if field not in data]
 
     if missing_fields:
         error_message = f"Missing required fields: {', '.join(missing_fields)}"
-        app.logger.error(error_message)
+        current_app.logger.error(error_message)
         return jsonify({'error': error_message}), 400
 
-    # Strip values and check for empty fields
-    title = data['title'].strip()
-    author = data['author'].strip()
-    isbn = data['isbn'].strip()
-
-    empty_fields = [field for field in required_fields if not data[field].strip()]
+    # Check for empty fields
+    empty_fields = [field for field in BOOK_FIELDS if not data[field].strip()]
     if empty_fields:
         error_message = f"Missing or empty required fields: {', '.join(empty_fields)}"
-        app.logger.error(error_message)
+        current_app.logger.error(error_message)
         return jsonify({'error': error_message}), 400
 
-    # Check for conflicts with other books
-    errors = []
+    # Optimistic concurrency: the client may only update the version it read
+    # The tag names a version, not a byte representation, so a W/ tag from a compressed GET is accepted too
+    if request.if_match and not request.if_match.contains_weak(book_etag(book_id, book.version)):
+        current_app.logger.info("Precondition failed for book %s", book_id)
+        return jsonify({'error': 'Book has been modified by another request'}), 412
 
-    # Title conflict check
-    if Book.query.filter(Book.title == title, Book.id != book_id).first():
+    errors = []
+    if book.title_taken:
         errors.append("A book with this title already exists")
-
-    # Author conflict check
-    if Book.query.filter(Book.author == author, Book.id != book_id).first():
+    if book.author_taken:
         errors.append("A book by this author already exists")
-
-    # ISBN conflict check
-    if Book.query.filter(Book.isbn == isbn, Book.id != book_id).first():
+    if book.isbn_taken:
         errors.append("A book with this ISBN already exists")
 
     # If any conflicts exist, return all errors with a 409 status
     if errors:
-        app.logger.info(f"Validation errors found: {errors}")
+        current_app.logger.info("Validation errors found: %s", errors)
         return jsonify({'errors': errors}), 409
 
-    # Update the book record
+    # isbn13 is only canonical for a valid ISBN; one stored before validation existed may be kept as it is
+    if isbn != book.isbn:
+        error = isbn_validation_error(isbn, to_isbn13(isbn))
+        if error:
+            current_app.logger.info("Invalid ISBN %s for book %s", isbn, book_id)
+            return jsonify({'error': error}), 400
+
+    # With sharded storage a new ISBN that belongs to another shard is claimed there first,
+    # so no book can be created with it in the meantime; the claim is dropped if the update fails
+    key = isbn_key(isbn)
+    home = shards.current_shard.get()
+    claimed = None
+    if key != book.isbn13 and isbn_shard(key) != home:
+        claimed = isbn_shard(key)
+        if not claim_isbn(claimed, key, book_id):
+            current_app.logger.info("ISBN %s taken concurrently", isbn)
+            return jsonify({'errors': ["A book with this ISBN already exists"]}), 409
+
+    # Update the book record, guarded by the version we read
     try:
-        book.title = title
-        book.author = author
-        book.isbn = isbn
+        updated = db.session.execute(
+            db.update(Book)
+            .where(Book.id == book_id, Book.version == book.version)
+            .values(title=title, author=author, isbn=isbn, isbn13=isbn_key(isbn), version=book.version + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.session.rollback()
+            if claimed is not None:
+                release_claim(claimed, key, book_id)
+            current_app.logger.info("Concurrent update detected for book %s", book_id)
+            return jsonify({'error': 'Book has been modified by another request'}), 412
+
+        record_changes('update', [{'book_id': book_id, 'title': title, 'author': author, 'isbn': isbn,
+                                   'version': book.version + 1}])
+        bump_catalog_version()
         db.session.commit()
-
-        app.logger.info(f"Successfully updated book {book_id}")
-        return jsonify({
-            'id': book.id,
-            'title': book.title,
-            'author': book.author,
-            'isbn': book.isbn
-        }), 200
-
+        if key != book.isbn13 and isbn_shard(book.isbn13) != home:
+            release_claim(isbn_shard(book.isbn13), book.isbn13, book_id)
+        current_app.logger.info("Successfully updated book %s", book_id)
+        response = json_response(to_record(BOOK_COLUMNS, (book_id, title, author, isbn)))
+        response.set_etag(book_etag(book_id, book.version + 1))
+        return response
+
+    except IntegrityError:
+        # Another request took the ISBN after the conflict check above
+        db.session.rollback()
+        if claimed is not None:
+            release_claim(claimed, key, book_id)
+        current_app.logger.info("ISBN %s taken concurrently", isbn)
+        return jsonify({'errors': ["A book with this ISBN already exists"]}), 409
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error updating book: {str(e)}")
+        if claimed is not None:
+            release_claim(claimed, key, book_id)
+        current_app.logger.error("Error updating book: %s", e)
         return jsonify({'error': 'An unexpected error occurred'}), 500
 
 
-@app.route('/api/books/<int:book_id>', methods=['DELETE'])
+@bp.route('/api/books/<int:book_id>', methods=['DELETE'])
+@with_book_shard
 def delete_book(book_id):
-    book = Book.query.get(book_id)
+    book = db.session.get(Book, book_id)
     if not book:
         return jsonify({'error': 'Book not found'}), 404
 
     try:
+        key = book.isbn13
         db.session.delete(book)
+        record_changes('delete', [{'book_id': book_id}])
+        bump_catalog_version()
         db.session.commit()
+        if isbn_shard(key) != shards.current_shard.get():
+            release_claim(isbn_shard(key), key, book_id)
         return '', 204
+    except StaleDataError:
+        # The version guard matched no row: another request updated or deleted the book since it was read
+        db.session.rollback()
+        if db.session.get(Book, book_id) is None:
+            return jsonify({'error': 'Book not found'}), 404
+        current_app.logger.info("Concurrent update detected for book %s", book_id)
+        return jsonify({'error': 'Book has been modified by another request'}), 409
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        current_app.logger.error("Error deleting book: %s", e)
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
+def parse_batch(data, key):
+    """Return the list of operations of a batch body, either bare or under `key`."""
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list) or not data:
+        raise ValueError('Request body must contain a non-empty list of operations')
+    if len(data) > current_app.config['BOOKS_BATCH_MAX_ITEMS']:
+        raise ValueError(f"A batch cannot contain more than {current_app.config['BOOKS_BATCH_MAX_ITEMS']} operations")
+    return data
+
+
+def is_book_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class ConflictIndex:
+    """Which book ids currently hold each title, author and canonical ISBN in a batch."""
+
+    def __init__(self, rows):
+        self.ids = {field: {} for field in BOOK_FIELDS}
+        for row in rows:
+            self.add(row.id, row.title, row.author, row.isbn)
+
+    def add(self, book_id, title, author, isbn):
+        for field, value in zip(BOOK_FIELDS, (title, author, isbn_key(isbn))):
+            self.ids[field].setdefault(value, set()).add(book_id)
+
+    def remove(self, book_id, title, author, isbn):
+        for field, value in zip(BOOK_FIELDS, (title, author, isbn_key(isbn))):
+            self.ids[field].get(value, set()).discard(book_id)
 
+    def conflicts(self, book_id, title, author, isbn):
+        errors = []
+        if self.ids['title'].get(title, set()) - {book_id}:
+            errors.append("A book with this title already exists")
+        if self.ids['author'].get(author, set()) - {book_id}:
+            errors.append("A book by this author already exists")
+        if self.ids['isbn'].get(isbn_key(isbn), set()) - {book_id}:
+            errors.append("A book with this ISBN already exists")
+        return errors
+
+
+@bp.route('/api/books/batch', methods=['PATCH'])
+@unsharded_only
+def update_books_batch():
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+
+    try:
+        operations = parse_batch(request.get_json(silent=True), 'books')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    ids = {op.get('id') for op in operations if isinstance(op, dict) and is_book_id(op.get('id'))}
+    values = {field: {op[field].strip() for op in operations
+                      if isinstance(op, dict) and isinstance(op.get(field), str)}
+              for field in BOOK_FIELDS}
+
+    # One query for the targets, one for every row that could conflict with the batch
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(ids))}
+    candidates = db.session.execute(
+        db.select(Book.id, Book.title, Book.author, Book.isbn).where(
+            Book.title.in_(values['title']) | Book.author.in_(values['author'])
+            | Book.isbn13.in_({isbn_key(isbn) for isbn in values['isbn']})
+        )
+    ).all()
+    index = ConflictIndex(candidates)
+    for book in books.values():
+        index.add(book.id, book.title, book.author, book.isbn)
+
+    results = []
+    for op in operations:
+        if not isinstance(op, dict) or not is_book_id(op.get('id')):
+            results.append({'status': 400, 'error': 'Each operation must be an object with an integer id'})
+            continue
+
+        book_id = op['id']
+        book = books.get(book_id)
+        if not book:
+            results.append({'id': book_id, 'status': 404, 'error': 'Book not found'})
+            continue
+
+        missing_fields = [field for field in BOOK_FIELDS if field not in op]
+        if missing_fields:
+            results.append({'id': book_id, 'status': 400,
+                            'error': f"Missing required fields: {', '.join(missing_fields)}"})
+            continue
+
+        empty_fields = [field for field in BOOK_FIELDS if not isinstance(op[field], str) or not op[field].strip()]
+        if empty_fields:
+            results.append({'id': book_id, 'status': 400,
+                            'error': f"Missing or empty required fields: {', '.join(empty_fields)}"})
+            continue
+
+        title, author, isbn = (op[field].strip() for field in BOOK_FIELDS)
+        errors = index.conflicts(book_id, title, author, isbn)
+        if errors:
+            results.append({'id': book_id, 'status': 409, 'errors': errors})
+            continue
+        error = isbn_validation_error(isbn, to_isbn13(isbn)) if isbn != book.isbn else None
+        if error:
+            results.append({'id': book_id, 'status': 400, 'error': error})
+            continue
+
+        index.remove(book.id, book.title, book.author, book.isbn)
+        book.title = title
+        book.author = author
+        book.isbn = isbn
+        book.isbn13 = isbn_key(isbn)
+        index.add(book.id, title, author, isbn)
+        results.append({'id': book_id, 'status': 200,
+                        'book': to_record(BOOK_COLUMNS, (book_id, title, author, isbn))})
+
+    try:
+        updated = [books[result['id']] for result in results if result['status'] == 200]
+        if updated:
+            # Flush first so each book carries the version the UPDATE gave it
+            db.session.flush()
+            record_changes('update', [{'book_id': book.id, 'title': book.title, 'author': book.author,
+                                       'isbn': book.isbn, 'version': book.version}
+                                      for book in {book.id: book for book in updated}.values()])
+            bump_catalog_version()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Error updating books: %s", e)
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+    return jsonify({'results': results}), 200
+
+
+@bp.route('/api/books/batch', methods=['DELETE'])
+@unsharded_only
+def delete_books_batch():
+    try:
+        ids = parse_batch(request.get_json(silent=True), 'ids')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    valid_ids = {book_id for book_id in ids if is_book_id(book_id)}
+    found = set(db.session.execute(db.select(Book.id).where(Book.id.in_(valid_ids))).scalars())
+
+    results = []
+    for book_id in ids:
+        if not is_book_id(book_id):
+            results.append({'id': book_id, 'status': 400, 'error': 'Book id must be an integer'})
+        elif book_id in found:
+            results.append({'id': book_id, 'status': 204})
+        else:
+            results.append({'id': book_id, 'status': 404, 'error': 'Book not found'})
+
+    try:
+        if found:
+            Book.query.filter(Book.id.in_(found)).delete(synchronize_session=False)
+            record_changes('delete', [{'book_id': book_id} for book_id in sorted(found)])
+            bump_catalog_version()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Error deleting books: %s", e)
+        return jsonify({'error': 'An unexpected error occurred'}), 500
 
-@app.errorhandler(404)
+    return jsonify({'results': results}), 200
+
+
+# Change feed: consumers keep a copy of the catalog in sync by reading the
+# BookChange log past the last seq they applied, so a sync costs one index
+# seek plus the changes themselves, whatever the size of the catalog.
+def record_changes(op, books):
+    """Append one `op` change per book dict (book_id, plus the new values) in the caller's transaction."""
+    changed_at = datetime.utcnow()
+    db.session.execute(db.insert(BookChange), [dict(book, op=op, changed_at=changed_at) for book in books])
+
+
+def record_inserts_after(last_id):
+    """Log every book with an id above `last_id` as inserted, in one INSERT ... SELECT."""
+    db.session.execute(db.insert(BookChange).from_select(
+        ['op', 'book_id', 'title', 'author', 'isbn', 'version', 'changed_at'],
+        db.select(db.literal('insert'), Book.id, Book.title, Book.author, Book.isbn, Book.version, Book.created_at)
+        .where(Book.id > last_id)
+        .order_by(Book.id)
+    ))
+
+
+def latest_change_seq():
+    return db.session.execute(db.select(db.func.max(BookChange.seq))).scalar() or 0
+
+
+def read_changes(since, limit):
+    return db.session.execute(
+        db.select(BookChange).where(BookChange.seq > since).order_by(BookChange.seq).limit(limit)
+    ).scalars().all()
+
+
+def change_record(change):
+    book = None
+    if change.op != 'delete':
+        book = {'id': change.book_id, 'title': change.title, 'author': change.author, 'isbn': change.isbn,
+                'version': change.version}
+    return {'seq': change.seq, 'op': change.op, 'book_id': change.book_id, 'book': book,
+            'changed_at': change.changed_at.isoformat()}
+
+
+def parse_since(value):
+    if value is None or value == '':
+        return 0
+    try:
+        since = int(value)
+    except ValueError:
+        raise ValueError('Since must be a non-negative integer')
+    if since < 0:
+        raise ValueError('Since must be a non-negative integer')
+    return since
+
+
+@bp.route('/api/books/changes', methods=['GET'])
+@unsharded_only
+def get_changes():
+    try:
+        since = parse_since(request.args.get('since'))
+        limit = parse_page_size(request.args.get('limit'), current_app.config['CHANGES_PAGE_SIZE'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    changes = read_changes(since, limit)
+    next_seq = changes[-1].seq if changes else since
+    response = json_response({
+        'changes': [change_record(change) for change in changes],
+        'next': next_seq,
+        'latest': latest_change_seq(),
+        'has_more': len(changes) == limit
+    })
+    if len(changes) == limit:
+        next_url = url_for('.get_changes', since=next_seq, limit=limit, _external=True)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def change_events(since, config):
+    """Yield Server-Sent Events for every change after `since`, polling the log until the stream expires."""
+    poll_interval = config['CHANGES_STREAM_POLL_INTERVAL']
+    heartbeat = config['CHANGES_STREAM_HEARTBEAT']
+    page_size = config['CHANGES_PAGE_SIZE']
+    # Ask the client to reconnect soon after the server ends the stream
+    yield f'retry: {int(poll_interval * 1000)}\n\n'
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < config['CHANGES_STREAM_MAX_SECONDS']:
+        changes = read_changes(since, page_size)
+        # Hand the connection back to the pool while the stream waits
+        db.session.close()
+        for change in changes:
+            since = change.seq
+            yield f'id: {change.seq}\nevent: change\ndata: {dumps(change_record(change)).decode()}\n\n'
+        if len(changes) == page_size:
+            continue
+        if changes:
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= heartbeat:
+            # A comment line keeps proxies from closing an idle connection
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        time.sleep(poll_interval)
+
+
+@bp.route('/api/books/changes/stream', methods=['GET'])
+@unsharded_only
+def stream_changes():
+    # A reconnecting EventSource resumes from the last event it received
+    try:
+        since = parse_since(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Every open stream holds one of the worker's threads, so only a few may be open at once
+    slots = current_app.extensions['change_stream_slots']
+    if not slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open change streams, try again later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    response = Response(stream_with_context(change_events(since, current_app.config)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the events
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(slots.release)
+    return response
+
+
+# Type-ahead suggestions.  Each worker's index follows the change log of
+# every database: a lookup first applies the changes made since the index's
+# position, whichever worker made them.  With more than SUGGEST_CATCH_UP_LIMIT
+# it applies only the latest ones and the skipped ones are picked up by a
+# rebuild, on a background thread while lookups carry on against the index.
+suggest_rebuild_lock = threading.Lock()
+suggest_catch_up_lock = threading.Lock()
+
+
+def latest_change_seqs(connections):
+    return tuple(connection.execute(db.select(db.func.max(BookChange.seq))).scalar() or 0
+                 for connection in connections)
+
+
+def rebuild_suggest_index(index, force=True):
+    """Reload `index` from the Book table of every database.
+
+    The change positions are read before the rows, so a change the rows
+    already hold is applied once more by the next catch-up, which is
+    harmless.  Unless `force`d, an index built meanwhile by another thread
+    and not stale since is left as it is.
+    """
+    with suggest_rebuild_lock:
+        if not force and index.position is not None and not index.stale:
+            return
+        with ExitStack() as stack:
+            connections = [stack.enter_context(engine.connect()) for engine in catalog_engines()]
+            position = latest_change_seqs(connections)
+            query = db.select(Book.id, Book.title, Book.author)
+            index.build(itertools.chain.from_iterable(connection.execute(query) for connection in connections),
+                        position)
+
+
+def catch_up_suggest_index(index, connections):
+    """Apply the changes made since the index's position, at most SUGGEST_CATCH_UP_LIMIT per database."""
+    limit = current_app.config['SUGGEST_CATCH_UP_LIMIT']
+    since = index.position
+    changes, position, skipped = [], [], False
+    for connection, seq in zip(connections, since):
+        columns = (BookChange.seq, BookChange.op, BookChange.book_id, BookChange.title, BookChange.author)
+        rows = connection.execute(
+            db.select(*columns).where(BookChange.seq > seq).order_by(BookChange.seq.desc()).limit(limit + 1)
+        ).all()
+        if len(rows) > limit:
+            rows, skipped = rows[:limit], True
+        changes += [row[1:] for row in reversed(rows)]
+        position.append(rows[0].seq if rows else seq)
+    index.apply(changes, since, tuple(position), skipped)
+
+
+def start_suggest_rebuild(index):
+    """Rebuild `index` on a background thread, unless a rebuild is already running."""
+    if suggest_rebuild_lock.locked():
+        return
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                rebuild_suggest_index(index, force=False)
+            except Exception as e:
+                app.logger.error("Error rebuilding the suggest index: %s", e)
+    threading.Thread(target=run, name='books-suggest-rebuild', daemon=True).start()
+
+
+def ensure_suggest_index(index):
+    """Bring `index` up to the latest change of every database before a lookup."""
+    if index.position is None:
+        # Nothing to serve yet (gunicorn builds it before forking)
+        rebuild_suggest_index(index, force=False)
+        return
+    with ExitStack() as stack:
+        connections = [stack.enter_context(engine.connect()) for engine in catalog_engines()]
+        if index.position != latest_change_seqs(connections):
+            with suggest_catch_up_lock:
+                # Another request may have caught up while this one waited; then there is little left to read
+                catch_up_suggest_index(index, connections)
+    if index.stale and time.time() - index.built_at >= current_app.config['SUGGEST_REBUILD_INTERVAL']:
+        start_suggest_rebuild(index)
+
+
+@bp.route('/api/books/suggest', methods=['GET'])
+def suggest_books():
+    prefix = request.args.get('prefix', '')
+    field = request.args.get('field', 'all')
+    if not prefix.strip():
+        return jsonify({'error': 'Prefix is required'}), 400
+    if field not in ['all', 'title', 'author']:
+        return jsonify({'error': 'Invalid suggest field'}), 400
+    try:
+        limit = min(parse_page_size(request.args.get('limit'), current_app.config['SUGGEST_LIMIT']),
+                    current_app.config['SUGGEST_MAX_LIMIT'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    index = current_app.extensions['suggest_index']
+    ensure_suggest_index(index)
+    fields = ('title', 'author') if field == 'all' else (field,)
+    return json_response(to_records(('id', 'title', 'author'), index.suggest(prefix, fields, limit)))
+
+
+@bp.route('/api/books/suggest/rebuild', methods=['POST'])
+def rebuild_suggestions():
+    index = current_app.extensions['suggest_index']
+    rebuild_suggest_index(index)
+    return jsonify(index.stats())
+
+
+@bp.route('/api/books/suggest/stats', methods=['GET'])
+def suggest_stats():
+    return jsonify(current_app.extensions['suggest_index'].stats())
+
+
+@bp.cli.command('rebuild-suggest-index')
+def rebuild_suggest_index_command():
+    """Build the suggest index from the database and print its size."""
+    index = current_app.extensions['suggest_index']
+    rebuild_suggest_index(index)
+    click.echo(json.dumps(index.stats(), indent=2))
+
+
+# Background jobs
+JOB_FINISHED = ('succeeded', 'failed', 'cancelled')
+
+
+class JobContext:
+    """Handed to a running job to report progress and to notice it should stop."""
+
+    def __init__(self, job_id, runner, interval):
+        self.job_id = job_id
+        self.runner = runner
+        self.interval = interval
+        self.done = 0
+        self.total = None
+        self.counts = {}
+        self._reported_at = 0.0
+
+    def progress(self):
+        return {'done': self.done, 'total': self.total, 'counts': dict(self.counts)}
+
+    def update(self, done=None, total=None, force=False, **counts):
+        """Record progress and raise JobCancelled if the job was cancelled or the worker is stopping.
+
+        The row is written (and the cancel flag read) at most once per interval unless
+        `force`. This commits, so call it between the job's own transactions.
+        """
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        self.counts.update(counts)
+        if self.runner.stopping:
+            raise JobCancelled()
+        now = time.monotonic()
+        if not force and now - self._reported_at < self.interval:
+            return
+        self._reported_at = now
+        cancel_requested = db.session.execute(
+            db.update(Job).where(Job.id == self.job_id).values(**self.progress()).returning(Job.cancel_requested)
+        ).scalar()
+        db.session.commit()
+        if cancel_requested:
+            raise JobCancelled()
+
+
+def finish_job(job_id, status, **values):
+    db.session.execute(db.update(Job).where(Job.id == job_id)
+                       .values(status=status, finished_at=datetime.utcnow(), **values))
+    db.session.commit()
+
+
+def run_job(app, job_id, func, args, cleanup):
+    """Pool thread body: run `func(context, *args)` and record how it ended."""
+    runner = app.extensions['job_runner']
+    with app.app_context():
+        context = JobContext(job_id, runner, app.config['JOBS_PROGRESS_INTERVAL'])
+        try:
+            # A job cancelled while it was queued is no longer 'queued' and is skipped
+            started = db.session.execute(
+                db.update(Job).where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', started_at=datetime.utcnow()).returning(Job.total)
+            ).first()
+            db.session.commit()
+            if started:
+                context.total = started.total
+                result = func(context, *args)
+                finish_job(job_id, 'succeeded', result=result, **context.progress())
+        except JobCancelled:
+            db.session.rollback()
+            if runner.stopping:
+                finish_job(job_id, 'failed', error='Interrupted by a worker shutdown', **context.progress())
+            else:
+                finish_job(job_id, 'cancelled', **context.progress())
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception("Job %s failed", job_id)
+            finish_job(job_id, 'failed', error=str(e), **context.progress())
+        finally:
+            if cleanup:
+                cleanup()
+            db.session.remove()
+
+
+def start_job(kind, func, *args, total=None, cleanup=None):
+    """Record a queued job and hand it to this worker's runner, returning its id.
+
+    Raises QueueFull, after running `cleanup`, if the runner cannot take it.
+    """
+    job_id = uuid.uuid4().hex
+    db.session.add(Job(id=job_id, kind=kind, status='queued', total=total, counts={}, pid=os.getpid()))
+    db.session.commit()
+    try:
+        current_app.extensions['job_runner'].submit(run_job, current_app._get_current_object(), job_id, func, args,
+                                                    cleanup)
+    except QueueFull:
+        db.session.execute(db.delete(Job).where(Job.id == job_id))
+        db.session.commit()
+        if cleanup:
+            cleanup()
+        raise
+    return job_id
+
+
+def interrupt_jobs(error, pid=None):
+    """Fail the unfinished jobs of process `pid` (of every process if None), which can no longer finish."""
+    query = db.update(Job).where(Job.status.in_(('queued', 'running')))
+    if pid is not None:
+        query = query.where(Job.pid == pid)
+    db.session.execute(query.values(status='failed', error=error, finished_at=datetime.utcnow()))
+    db.session.commit()
+
+
+def stop_jobs(app):
+    """Ask this process's running jobs to stop at their next checkpoint and wait for them."""
+    app.extensions['job_runner'].shutdown()
+    with app.app_context():
+        interrupt_jobs('Interrupted by a worker shutdown', os.getpid())
+
+
+def job_record(job):
+    return {
+        'id': job.id, 'kind': job.kind, 'status': job.status,
+        'done': job.done, 'total': job.total, 'counts': job.counts or {},
+        'result': job.result, 'error': job.error, 'cancel_requested': job.cancel_requested,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def job_accepted(job_id):
+    response = json_response(job_record(db.session.get(Job, job_id)), 202)
+    response.headers['Location'] = url_for('.get_job', job_id=job_id, _external=True)
+    return response
+
+
+def jobs_unavailable():
+    response = jsonify({'error': 'Too many jobs are running, try again later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+def import_job(context, path, content_type):
+    """Import a spooled bulk body, keeping only the first JOBS_MAX_ERRORS row errors."""
+    config = current_app.config
+    results = []
+    errors = []
+    rejected = 0
+
+    def after_batch(rows, accepted, final=False):
+        nonlocal rejected
+        for result in results:
+            if result['status'] != 201:
+                rejected += 1
+                if len(errors) < config['JOBS_MAX_ERRORS']:
+                    errors.append(result)
+        results.clear()
+        if final or (context.total is not None and rows >= context.total):
+            # Every row is committed: a cancel arriving now must not discard the finished import
+            context.done = rows
+            context.counts.update(accepted=accepted, rejected=rejected)
+            return
+        context.update(done=rows, accepted=accepted, rejected=rejected)
+        time.sleep(config['JOBS_BATCH_PAUSE'])
+
+    with open(path, 'rb') as stream:
+        try:
+            accepted = import_books(stream, content_type, results, after_batch)
+        except UnicodeDecodeError:
+            raise ValueError('Request body must be UTF-8 encoded')
+
+    errors.sort(key=lambda result: result['row'])
+    return {'accepted': accepted, 'rejected': rejected, 'errors': errors}
+
+
+def start_import_job(content_type):
+    # Refuse before reading what may be a large body
+    if current_app.extensions['job_runner'].full():
+        return jobs_unavailable()
+
+    lines = 0
+    last = b''
+    with tempfile.NamedTemporaryFile(prefix='books-import-', dir=current_app.config['JOBS_SPOOL_DIR'],
+                                     delete=False) as spool:
+        while True:
+            chunk = request.stream.read(1 << 20)
+            if not chunk:
+                break
+            spool.write(chunk)
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+    if last not in (b'', b'\n'):
+        lines += 1
+    # An estimate: blank lines and quoted CSV line breaks are counted too
+    total = max(lines - 1, 0) if content_type == 'text/csv' else lines
+
+    try:
+        job_id = start_job('import', import_job, spool.name, content_type, total=total,
+                           cleanup=lambda: os.remove(spool.name))
+    except QueueFull:
+        return jobs_unavailable()
+    return job_accepted(job_id)
+
+
+def reindex_job(context):
+    """Rebuild the full-text index, then this worker's suggest index."""
+    context.update(total=2, force=True)
+    if fts_enabled():
+        for shard in range(shard_count()) if shard_count() else [None]:
+            with shard_scope(shard):
+                db.session.connection().exec_driver_sql("INSERT INTO book_fts(book_fts) VALUES ('rebuild')")
+                db.session.commit()
+    context.update(done=1, force=True)
+    index = current_app.extensions['suggest_index']
+    rebuild_suggest_index(index)
+    context.done = 2
+    return {'fts': fts_enabled(), 'suggest': index.stats()}
+
+
+@bp.route('/api/jobs/reindex', methods=['POST'])
+def start_reindex_job():
+    try:
+        job_id = start_job('reindex', reindex_job, total=2)
+    except QueueFull:
+        return jobs_unavailable()
+    return job_accepted(job_id)
+
+
+@bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return json_response(job_record(job))
+
+
+@bp.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status in JOB_FINISHED:
+        return jsonify({'error': f'Job already {job.status}'}), 409
+
+    # A queued job is cancelled outright; a running one stops at its next progress update
+    db.session.execute(db.update(Job).where(Job.id == job_id, Job.status == 'queued')
+                       .values(status='cancelled', finished_at=datetime.utcnow()))
+    db.session.execute(db.update(Job).where(Job.id == job_id).values(cancel_requested=True))
+    db.session.commit()
+    return json_response(job_record(db.session.get(Job, job_id)), 202)
+
+
+@bp.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(current_app.extensions['job_runner'].stats())
+
+
+@bp.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'generation': current_catalog_version(),
+        'books': current_app.extensions['book_cache'].stats(),
+        'search': current_app.extensions['search_cache'].stats()
+    })
+
+
+@bp.after_app_request
+def compress_response(response):
+    """gzip/brotli-encode JSON and HTML bodies the client accepts, reusing cached bodies per ETag."""
+    config = current_app.config
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings, available_encodings())
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    # The ETag already carries the catalog or book version, so it alone keys the cache
+    etag, _ = response.get_etag()
+    cache = current_app.extensions['compressed_cache']
+    compressed = cache.get((etag, encoding), None) if etag else None
+    seconds = 0.0
+    if compressed is None:
+        started = time.thread_time()
+        compressed = compress(body, encoding, config['COMPRESS_GZIP_LEVEL'], config['COMPRESS_BROTLI_QUALITY'])
+        seconds = time.thread_time() - started
+        if etag:
+            cache.set((etag, encoding), None, compressed)
+        cached = False
+    else:
+        cached = True
+
+    current_app.extensions['compression_stats'].record(
+        request.endpoint or 'unknown', encoding, len(body), len(compressed), seconds, cached)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # A different byte representation of the same version
+        response.set_etag(etag, weak=True)
+    return response
+
+
+@bp.route('/api/compression/stats', methods=['GET'])
+def compression_stats():
+    return jsonify({
+        'encodings': available_encodings(),
+        'routes': current_app.extensions['compression_stats'].snapshot(),
+        'cache': current_app.extensions['compressed_cache'].stats()
+    })
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_export():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     if request.path.startswith('/api/'):
         return jsonify({"error": "Resource not found"}), 404
     return render_template('404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_server_error(error):
     if request.path.startswith('/api/'):
         return jsonify({"error": "An unexpected error occurred"}), 500
     return render_template('500.html'), 500
 
 
+app = create_app()
+
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True, port=5000)
+    init_db(app)
+    app.run(debug=app.config['DEBUG'], port=5000)
@@ -0,0 +1,174 @@
+import os
+
+
+class BaseConfig:
+    SECRET_KEY = 'your-secret-key'
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///books.db'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pool_pre_ping': False,
+    }
+    # Optional read-only database used by GET requests, e.g.
+    # 'sqlite:///file:/path/to/books.db?mode=ro&uri=true'
+    READ_DATABASE_URI = None
+    # Optional sharded storage: books split across these SQLite files by a hash of their ISBN
+    # (see docs/serving.md); the main database keeps users and jobs.  Set before the first start,
+    # e.g. BOOKS_CONFIG_SHARD_DATABASE_URIS='["sqlite:////data/books-0.db", "sqlite:////data/books-1.db"]'
+    SHARD_DATABASE_URIS = []
+
+    # Applied on every new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+    }
+
+    BOOKS_PAGE_SIZE = 100
+    BOOKS_MAX_PAGE_SIZE = 1000
+    BOOKS_STREAM_BATCH_SIZE = 1000
+    BOOKS_SEARCH_LIMIT = 50
+    BOOKS_BULK_BATCH_SIZE = 5000
+    BOOKS_BATCH_MAX_ITEMS = 10000
+    # Rows per chunk of /api/books/export (and per Parquet row group)
+    EXPORT_BATCH_SIZE = 20000
+    BOOK_CACHE_SIZE = 10000
+    BOOK_CACHE_TTL = 300
+    # Seconds a worker serves book cache hits without re-reading the catalog version, so a
+    # write made by another worker may take this long to show in GET /api/books/<id>
+    CATALOG_VERSION_TTL = 1.0
+    SEARCH_CACHE_SIZE = 1000
+    SEARCH_CACHE_TTL = 60
+    # Rendered table rows of the /books page, per page and catalog version
+    BOOKS_HTML_PAGE_SIZE = 50
+    FRAGMENT_CACHE_SIZE = 256
+    FRAGMENT_CACHE_TTL = 300
+
+    # Authors listed by /api/books/stats, by default and at most
+    STATS_TOP_AUTHORS = 10
+    STATS_MAX_TOP_AUTHORS = 1000
+
+    # In-memory type-ahead index behind /api/books/suggest
+    SUGGEST_LIMIT = 10
+    SUGGEST_MAX_LIMIT = 50
+    SUGGEST_MAX_BOOKS = 1000000
+    SUGGEST_MAX_KEY_LENGTH = 64
+    SUGGEST_TRIGRAMS = True
+    # A lookup applies up to this many of the latest changes per database in place; any
+    # older ones it skips are picked up by a background rebuild, at most once every
+    # SUGGEST_REBUILD_INTERVAL seconds
+    SUGGEST_CATCH_UP_LIMIT = 1000
+    SUGGEST_REBUILD_INTERVAL = 5
+
+    # Change feed (/api/books/changes) and its Server-Sent Events stream
+    CHANGES_PAGE_SIZE = 500
+    CHANGES_STREAM_POLL_INTERVAL = 1.0
+    CHANGES_STREAM_HEARTBEAT = 15
+    # Each open stream holds a worker thread: streams end after this many seconds (the client
+    # reconnects from its Last-Event-ID) and only this many may be open per worker process
+    CHANGES_STREAM_MAX_SECONDS = 300
+    CHANGES_STREAM_MAX_CLIENTS = 2
+    # Seconds between the books page's polls of /api/books/changes when it cannot keep a stream open
+    CHANGES_POLL_INTERVAL = 5
+
+    # Background jobs (bulk imports with ?async=1, reindexing): each worker process runs at most
+    # JOBS_MAX_WORKERS at once and holds JOBS_MAX_QUEUED more; beyond that job requests get a 503
+    JOBS_MAX_WORKERS = 1
+    JOBS_MAX_QUEUED = 4
+    # Minimum seconds between progress writes (and cancel checks) of a running job
+    JOBS_PROGRESS_INTERVAL = 0.5
+    # Pause after each imported batch, leaving the write lock free for request handlers
+    JOBS_BATCH_PAUSE = 0.05
+    # Per-row errors kept in a finished job's result
+    JOBS_MAX_ERRORS = 100
+    # Where async bulk bodies are spooled before the job reads them (None: the system temp dir)
+    JOBS_SPOOL_DIR = None
+
+    # Response compression (gzip, plus brotli when the module is installed)
+    COMPRESS_MIMETYPES = ['application/json', 'text/html']
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5
+    # Compressed bodies of responses with an ETag, reused until the ETag changes
+    COMPRESS_CACHE_SIZE = 256
+    COMPRESS_CACHE_TTL = 300
+
+    # Request tracing: the share of requests traced, and where traces go
+    TRACE_SAMPLE_RATE = 0.0
+    TRACE_FILE = 'logs/traces.jsonl'
+    # The same SELECT this many times in one traced request is reported as N+1
+    TRACE_N_PLUS_ONE_THRESHOLD = 5
+    # Statements slower than this are logged with their parameters and query plan
+    SLOW_QUERY_MS = 100
+    SLOW_QUERY_LOG = 'logs/slow_queries.log'
+
+    # Application logs are written as JSON lines by a background thread
+    LOG_LEVEL = 'INFO'
+    LOG_FILE = None
+    LOG_QUEUE_SIZE = 10000
+    # Share of DEBUG/INFO records kept per endpoint; warnings and errors are always kept
+    LOG_SAMPLE_RATES = {}
+    # Longest logged representation of request headers and bodies
+    LOG_MAX_FIELD_SIZE = 2048
+
+
+class DevelopmentConfig(BaseConfig):
+    DEBUG = True
+    TRACE_SAMPLE_RATE = 1.0
+    LOG_LEVEL = 'DEBUG'
+    # Small batches, so that the API suite's bulk bodies span several of them
+    BOOKS_BULK_BATCH_SIZE = 100
+
+
+class QAConfig(BaseConfig):
+    DEBUG = False
+
+
+class ProductionConfig(BaseConfig):
+    DEBUG = False
+    TRACE_SAMPLE_RATE = 0.01
+    LOG_FILE = 'logs/books.log'
+    LOG_SAMPLE_RATES = {'update_book': 0.1}
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 10,
+        'pool_recycle': 3600,
+        'pool_pre_ping': False,
+    }
+    SQLITE_PRAGMAS = dict(BaseConfig.SQLITE_PRAGMAS, cache_size=-256000, busy_timeout=10000)
+
+
+APP_CONFIGS = {
+    'development': DevelopmentConfig,
+    'qa': QAConfig,
+    'production': ProductionConfig,
+}
+
+# Environment variables that override single settings without code edits
+ENV_OVERRIDES = {
+    'BOOKS_SECRET_KEY': 'SECRET_KEY',
+    'BOOKS_DATABASE_URI': 'SQLALCHEMY_DATABASE_URI',
+    'BOOKS_READ_DATABASE_URI': 'READ_DATABASE_URI',
+}
+
+
+def load_app_config(app, config_name=None):
+    """Load the settings for `config_name` (default: $BOOKS_ENV or development)."""
+    config_name = config_name or os.environ.get('BOOKS_ENV', 'development')
+    if config_name not in APP_CONFIGS:
+        raise ValueError(f"Unknown configuration '{config_name}', expected one of {', '.join(APP_CONFIGS)}")
+
+    app.config.from_object(APP_CONFIGS[config_name])
+    for variable, key in ENV_OVERRIDES.items():
+        if os.environ.get(variable):
+            app.config[key] = os.environ[variable]
+    # Any other setting can be given as BOOKS_CONFIG_<KEY>, parsed as JSON when possible
+    app.config.from_prefixed_env('BOOKS_CONFIG')
+    app.config['BOOKS_ENV'] = config_name
+    return app.config
@@ -0,0 +1,68 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden from the environment without code edits.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('BOOKS_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('BOOKS_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('BOOKS_THREADS', 4))
+worker_class = 'gthread'
+
+# Import the app once in the master and fork the workers from it
+preload_app = True
+
+# Recycle workers periodically; the jitter keeps them from restarting together
+max_requests = int(os.environ.get('BOOKS_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('BOOKS_MAX_REQUESTS_JITTER', 1000))
+# Time a worker gets to finish in-flight requests on HUP or shutdown
+graceful_timeout = int(os.environ.get('BOOKS_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('BOOKS_TIMEOUT', 60))
+keepalive = 5
+
+# Workers write their metrics to per-process files here and /metrics sums them.
+# Set before the app (and prometheus_client) is imported.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'books-metrics'))
+
+accesslog = os.environ.get('BOOKS_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def on_starting(server):
+    # Start every run from empty counters
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+    # Create and upgrade the schema once in the master, before any worker exists
+    from app import app, init_db, rebuild_suggest_index
+    init_db(app)
+    # Built before fork, so the workers share its pages copy-on-write
+    with app.app_context():
+        rebuild_suggest_index(app.extensions['suggest_index'])
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the children
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Stop background jobs at their next checkpoint instead of waiting for them to finish
+    from app import app, stop_jobs
+    stop_jobs(app)
+
+
+def child_exit(server, worker):
+    from utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+    # A worker that died without a clean exit leaves its jobs marked as running
+    from app import app, interrupt_jobs
+    with app.app_context():
+        interrupt_jobs('Interrupted by a worker exit', worker.pid)
@@ -3,13 +3,14 @@ import logging
 import random
 import string
 from project1.config.config import TestConfig
+from project1.utils.isbn import to_isbn13
+from project1.utils.utils import generate_random_isbn10
 
 logger = logging.getLogger('pytest')
 
 
 @pytest.mark.parametrize("title, author, isbn, expected_status, expected_error", [
-    ("The story of my life 2025", "Avital Zemnucha", "1234567890", 409,
-     "Duplicate book detected! The book is already in the list."),
+    ("The story of my life 2025", "Avital Zemnucha", "1234567890", 400, "ISBN check digit is invalid."),
     ("", "Tofi222", "1020306050", 400, "Missing or empty required fields: title"),
     ("Kofkof", "", "1020306050", 400, "Missing or empty required fields: author"),
     ("Kofkof", "Tofi222", "", 400, "Missing or empty required fields: isbn"),
@@ -18,6 +19,7 @@ logger = logging.getLogger('pytest')
      "Title contains special characters, only alphanumeric characters and spaces are allowed."),
     ("MipMip", "MipMip12121", "1020306050", 400, "Author name cannot contain numbers."),
     ("MipMip", "Hihi", "20AAAA203030", 400, "ISBN must be numeric and either 10 or 13 digits long."),
+    ("MipMip", "Hihi", "9780306406158", 400, "ISBN check digit is invalid."),
 
 ])
 @pytest.mark.api
@@ -38,7 +40,7 @@ def test_create_new_book(api_client):  ###verify that it  doesn't exist, use ran
     # Generate a random book
     title = "Book " + ''.join(random.choices(string.ascii_letters, k=5))
     author = "Author " + ''.join(random.choices(string.ascii_letters, k=5))
-    isbn = ''.join(random.choices(string.digits, k=10))
+    isbn = generate_random_isbn10()
 
     response = api_client.get(TestConfig.API_BOOKS_URL)
     existing_books = response.json()
@@ -58,3 +60,29 @@ def test_create_new_book(api_client):  ###verify that it  doesn't exist, use ran
     assert data['author'] == author
     assert data['title'] == title
     assert data['isbn'] == isbn
+
+
+@pytest.mark.api
+def test_create_book_duplicate_isbn10_of_isbn13(api_client):
+    isbn10 = generate_random_isbn10()
+    params = {"title": "Book " + ''.join(random.choices(string.ascii_letters, k=8)),
+              "author": "Author " + ''.join(random.choices(string.ascii_letters, k=8)),
+              "isbn": to_isbn13(isbn10)}
+    assert api_client.post(TestConfig.API_BOOKS_URL, json=params).status_code == 201
+
+    params["isbn"] = isbn10
+    response = api_client.post(TestConfig.API_BOOKS_URL, json=params)
+    assert response.status_code == 409
+    assert response.json()['error'] == "Duplicate book detected! The book is already in the list."
+
+
+@pytest.mark.api
+def test_create_book_duplicate_isbn(api_client):
+    params = {"title": "Book " + ''.join(random.choices(string.ascii_letters, k=8)),
+              "author": "Author " + ''.join(random.choices(string.ascii_letters, k=8)),
+              "isbn": generate_random_isbn10()}
+    assert api_client.post(TestConfig.API_BOOKS_URL, json=params).status_code == 201
+
+    response = api_client.post(TestConfig.API_BOOKS_URL, json=params)
+    assert response.status_code == 409
+    assert response.json()['error'] == "Duplicate book detected! The book is already in the list."
@@ -0,0 +1,84 @@
+import pytest
+import logging
+from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_string, generate_random_isbn
+
+logger = logging.getLogger('pytest')
+
+
+def create_book(api_client):
+    params = {
+        "title": generate_random_string(10),
+        "author": generate_random_string(10),
+        "isbn": generate_random_isbn()
+    }
+    response = api_client.post(TestConfig.API_BOOKS_URL, json=params)
+    assert response.status_code == 201
+    return response.json()
+
+
+@pytest.mark.api
+def test_batch_update_books(api_client):
+    first = create_book(api_client)
+    second = create_book(api_client)
+    new_title = generate_random_string(10)
+    operations = [
+        {"id": first['id'], "title": new_title, "author": first['author'], "isbn": first['isbn']},
+        {"id": second['id'], "title": new_title, "author": second['author'], "isbn": second['isbn']},
+        {"id": 999999, "title": "A", "author": "B", "isbn": "1234567890"},
+        {"id": first['id'], "title": new_title, "author": first['author']},
+    ]
+    response = api_client.patch(f"{TestConfig.API_BOOKS_URL}/batch", json=operations)
+    data = response.json()
+    assert response.status_code == 200
+    assert [result['status'] for result in data['results']] == [200, 409, 404, 400]
+    assert data['results'][0]['book']['title'] == new_title
+    assert data['results'][1]['errors'] == ["A book with this title already exists"]
+    assert data['results'][2]['error'] == "Book not found"
+    assert data['results'][3]['error'] == "Missing required fields: isbn"
+
+    check_response = api_client.get(f"{TestConfig.API_BOOKS_URL}/{first['id']}")
+    assert check_response.json()['title'] == new_title
+
+
+@pytest.mark.api
+def test_batch_update_rejects_invalid_isbn(api_client):
+    book = create_book(api_client)
+    operations = [
+        {"id": book['id'], "title": book['title'], "author": book['author'], "isbn": "abc"},
+        {"id": book['id'], "title": book['title'], "author": book['author'], "isbn": "9780306406158"},
+    ]
+    response = api_client.patch(f"{TestConfig.API_BOOKS_URL}/batch", json=operations)
+    data = response.json()
+    assert response.status_code == 200
+    assert [result['status'] for result in data['results']] == [400, 400]
+    assert data['results'][0]['error'] == "ISBN must be numeric and either 10 or 13 digits long."
+    assert data['results'][1]['error'] == "ISBN check digit is invalid."
+    assert api_client.get(f"{TestConfig.API_BOOKS_URL}/{book['id']}").json()['isbn'] == book['isbn']
+
+
+@pytest.mark.api
+def test_batch_delete_books(api_client):
+    first = create_book(api_client)
+    second = create_book(api_client)
+    response = api_client.delete(f"{TestConfig.API_BOOKS_URL}/batch",
+                                 json={"ids": [first['id'], second['id'], 999999]})
+    data = response.json()
+    assert response.status_code == 200
+    assert [result['status'] for result in data['results']] == [204, 204, 404]
+
+    for book in (first, second):
+        check_response = api_client.get(f"{TestConfig.API_BOOKS_URL}/{book['id']}")
+        assert check_response.status_code == 404
+
+
+@pytest.mark.api
+@pytest.mark.parametrize("method, body", [
+    ("patch", []),
+    ("delete", {"ids": []}),
+])
+def test_batch_empty_request(api_client, method, body):
+    response = getattr(api_client, method)(f"{TestConfig.API_BOOKS_URL}/batch", json=body)
+    data = response.json()
+    assert response.status_code == 400
+    assert data['error'] == "Request body must contain a non-empty list of operations"
@@ -0,0 +1,51 @@
+import pytest
+import json
+import logging
+from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_string, generate_random_isbn
+
+logger = logging.getLogger('pytest')
+
+
+@pytest.mark.api
+def test_bulk_import_ndjson(api_client):
+    isbn = generate_random_isbn()
+    rows = [
+        {"title": generate_random_string(8), "author": generate_random_string(8), "isbn": isbn},
+        {"title": generate_random_string(8), "author": generate_random_string(8), "isbn": isbn},
+        {"title": "?#$%^&", "author": "Hihi", "isbn": generate_random_isbn()},
+        {"title": generate_random_string(8), "author": "", "isbn": generate_random_isbn()},
+    ]
+    body = "\n".join(json.dumps(row) for row in rows)
+    response = api_client.post(f"{TestConfig.API_BOOKS_URL}/bulk", data=body,
+                               headers={"Content-Type": "application/x-ndjson"})
+    data = response.json()
+    assert response.status_code == 200
+    assert data['accepted'] == 1
+    assert data['rejected'] == 3
+    assert [row['status'] for row in data['rows']] == [201, 409, 400, 400]
+    assert data['rows'][1]['error'] == "Duplicate book detected! The book is already in the list."
+    assert data['rows'][3]['error'] == "Missing or empty required fields: author"
+
+
+@pytest.mark.api
+def test_bulk_import_csv(api_client):
+    isbn = generate_random_isbn()
+    body = f"title,author,isbn\n{generate_random_string(8)},{generate_random_string(8)},{isbn}\n"
+    response = api_client.post(f"{TestConfig.API_BOOKS_URL}/bulk", data=body,
+                               headers={"Content-Type": "text/csv"})
+    data = response.json()
+    assert response.status_code == 200
+    assert data['accepted'] == 1
+
+    search_response = api_client.get(f"{TestConfig.API_BOOKS_URL}/search", params={"q": isbn, "field": "isbn"})
+    assert search_response.status_code == 200
+    assert search_response.json()[0]['isbn'] == isbn
+
+
+@pytest.mark.api
+def test_bulk_import_invalid_content_type(api_client):
+    response = api_client.post(f"{TestConfig.API_BOOKS_URL}/bulk", json=[])
+    data = response.json()
+    assert response.status_code == 400
+    assert data['error'] == "Content-Type must be application/x-ndjson or text/csv"
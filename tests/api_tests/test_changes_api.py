@@ -0,0 +1,73 @@
+import pytest
+import json
+import logging
+from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_string, generate_random_isbn
+
+logger = logging.getLogger('pytest')
+
+CHANGES_URL = f"{TestConfig.API_BOOKS_URL}/changes"
+
+
+def latest_seq(api_client):
+    return api_client.get(CHANGES_URL, params={"limit": 1}).json()['latest']
+
+
+@pytest.mark.api
+def test_changes_follow_writes_in_order(api_client):
+    since = latest_seq(api_client)
+    params = {"title": generate_random_string(8), "author": generate_random_string(8), "isbn": generate_random_isbn()}
+    book = api_client.post(TestConfig.API_BOOKS_URL, json=params).json()
+    params["title"] = generate_random_string(8)
+    assert api_client.put(f"{TestConfig.API_BOOKS_URL}/{book['id']}", json=params).status_code == 200
+    assert api_client.delete(f"{TestConfig.API_BOOKS_URL}/{book['id']}").status_code == 204
+
+    response = api_client.get(CHANGES_URL, params={"since": since})
+    data = response.json()
+    assert response.status_code == 200
+    changes = [change for change in data['changes'] if change['book_id'] == book['id']]
+    assert [change['op'] for change in changes] == ["insert", "update", "delete"]
+    assert changes[1]['book']['title'] == params['title']
+    assert changes[1]['book']['version'] == 2
+    assert changes[2]['book'] is None
+    assert [change['seq'] for change in data['changes']] == sorted(change['seq'] for change in data['changes'])
+    assert data['next'] == data['changes'][-1]['seq']
+
+
+@pytest.mark.api
+def test_changes_next_cursor(api_client):
+    since = latest_seq(api_client)
+    for _ in range(3):
+        params = {"title": generate_random_string(8), "author": generate_random_string(8),
+                  "isbn": generate_random_isbn()}
+        api_client.post(TestConfig.API_BOOKS_URL, json=params)
+
+    first_page = api_client.get(CHANGES_URL, params={"since": since, "limit": 2}).json()
+    assert first_page['has_more'] is True
+    second_page = api_client.get(CHANGES_URL, params={"since": first_page['next'], "limit": 2}).json()
+    assert second_page['changes'][0]['seq'] > first_page['changes'][-1]['seq']
+
+
+@pytest.mark.api
+def test_changes_stream_sends_events(api_client):
+    since = latest_seq(api_client)
+    params = {"title": generate_random_string(8), "author": generate_random_string(8), "isbn": generate_random_isbn()}
+    book = api_client.post(TestConfig.API_BOOKS_URL, json=params).json()
+
+    with api_client.get(f"{CHANGES_URL}/stream", params={"since": since}, stream=True, timeout=10) as response:
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/event-stream')
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith('data: '):
+                change = json.loads(line[len('data: '):])
+                break
+    assert change['op'] == "insert"
+    assert change['book_id'] == book['id']
+
+
+@pytest.mark.parametrize("since", ["-1", "abc"])
+@pytest.mark.api
+def test_changes_negative(api_client, since):
+    response = api_client.get(CHANGES_URL, params={"since": since})
+    assert response.status_code == 400
+    assert response.json()['error'] == "Since must be a non-negative integer"
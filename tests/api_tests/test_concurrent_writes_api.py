@@ -0,0 +1,69 @@
+import pytest
+import random
+import threading
+import time
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_string, generate_random_isbn
+
+logger = logging.getLogger('pytest')
+
+CLIENTS = 32
+POSTS = 300
+PUTS = 200
+# A small shared pool, so most writes race another write for the same ISBN
+SHARED_ISBNS = 20
+PUT_TARGETS = 10
+
+
+def book_params(isbn):
+    return {"title": "Stress " + generate_random_string(10), "author": "Stress " + generate_random_string(10),
+            "isbn": isbn}
+
+
+@pytest.mark.api
+def test_concurrent_writes_with_overlapping_isbns(api_client):
+    shared_isbns = [generate_random_isbn() for _ in range(SHARED_ISBNS)]
+    targets = []
+    for _ in range(PUT_TARGETS):
+        response = api_client.post(TestConfig.API_BOOKS_URL, json=book_params(generate_random_isbn()))
+        assert response.status_code == 201
+        targets.append(response.json()['id'])
+
+    operations = [('POST', None, random.choice(shared_isbns)) for _ in range(POSTS)]
+    operations += [('PUT', random.choice(targets), random.choice(shared_isbns)) for _ in range(PUTS)]
+    random.shuffle(operations)
+
+    # requests.Session is not thread-safe; give each client thread its own
+    local = threading.local()
+
+    def send(operation):
+        method, book_id, isbn = operation
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        if method == 'POST':
+            response = local.session.post(TestConfig.API_BOOKS_URL, json=book_params(isbn))
+        else:
+            response = local.session.put(f"{TestConfig.API_BOOKS_URL}/{book_id}", json=book_params(isbn))
+        return method, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        results = list(pool.map(send, operations))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(results)
+    logger.info("%d concurrent writes from %d clients in %.2fs (%.0f requests/s): %s",
+                len(operations), CLIENTS, elapsed, len(operations) / elapsed, dict(statuses))
+
+    assert not [result for result in statuses if result[1] >= 500]
+    assert set(statuses) <= {('POST', 201), ('POST', 409), ('PUT', 200), ('PUT', 409), ('PUT', 412)}
+    # Each shared ISBN can have been created by at most one POST
+    assert statuses[('POST', 201)] <= SHARED_ISBNS
+    for isbn in shared_isbns:
+        assert api_client.get(f"{TestConfig.API_BOOKS_URL}/isbn/{isbn}").status_code in (200, 404)
@@ -0,0 +1,69 @@
+import pytest
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_string, generate_random_isbn
+
+logger = logging.getLogger('pytest')
+
+EXPORT_URL = f"{TestConfig.API_BOOKS_URL}/export"
+
+
+@pytest.fixture
+def exported_book(api_client):
+    book = {"title": "Export " + generate_random_string(10), "author": "Export Author",
+            "isbn": generate_random_isbn()}
+    response = api_client.post(TestConfig.API_BOOKS_URL, json=book)
+    assert response.status_code == 201
+    return response.json()
+
+
+@pytest.mark.api
+def test_export_ndjson(api_client, exported_book):
+    response = api_client.get(EXPORT_URL, params={"format": "ndjson"}, stream=True)
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('application/x-ndjson')
+    assert int(response.headers['X-Change-Seq']) > 0
+
+    books = {book['id']: book for book in map(json.loads, response.iter_lines())}
+    book = books[exported_book['id']]
+    assert book['title'] == exported_book['title']
+    assert book['isbn'] == exported_book['isbn']
+    datetime.fromisoformat(book['created_at'])
+    assert list(books) == sorted(books)
+
+
+@pytest.mark.api
+def test_export_csv(api_client, exported_book):
+    response = api_client.get(EXPORT_URL, params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/csv')
+    assert 'attachment' in response.headers['Content-Disposition']
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == ['id', 'title', 'author', 'isbn', 'created_at']
+    row = next(row for row in rows if row['id'] == str(exported_book['id']))
+    assert row['author'] == exported_book['author']
+
+
+@pytest.mark.api
+def test_export_parquet(api_client, exported_book):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    response = api_client.get(EXPORT_URL, params={"format": "parquet"})
+    if response.status_code == 400:
+        pytest.skip("The server has no Parquet support")
+    assert response.status_code == 200
+
+    table = pyarrow_parquet.read_table(io.BytesIO(response.content))
+    assert table.column_names == ['id', 'title', 'author', 'isbn', 'created_at']
+    assert exported_book['id'] in table.column('id').to_pylist()
+
+
+@pytest.mark.api
+def test_export_invalid_format(api_client):
+    response = api_client.get(EXPORT_URL, params={"format": "xml"})
+    assert response.status_code == 400
+    assert response.json()['error'].startswith("Format must be one of: csv, ndjson")
@@ -1,6 +1,9 @@
 import pytest
+import json
 import logging
 from project1.config.config import TestConfig
+from project1.utils.isbn import to_isbn13
+from project1.utils.utils import generate_random_string, generate_random_isbn, generate_random_isbn10
 
 logger = logging.getLogger('pytest')
 
@@ -64,3 +67,245 @@ def test_search_book(api_client, q, field, expected_status, expected_error):
 
     else:
         assert data['error'] == expected_error
+
+
+@pytest.mark.api
+def test_get_books_pagination(api_client):
+    response = api_client.get(TestConfig.API_BOOKS_URL, params={"limit": 2})
+    data = response.json()
+    assert response.status_code == 200
+    assert len(data) == 2
+    assert data[0]['id'] < data[1]['id']
+    assert 'next' in response.links
+
+    next_response = api_client.get(response.links['next']['url'])
+    next_data = next_response.json()
+    assert next_response.status_code == 200
+    assert next_data
+    assert next_data[0]['id'] > data[-1]['id']
+
+
+@pytest.mark.parametrize("params, expected_error", [
+    ({"limit": 0}, "Limit must be a positive integer"),
+    ({"limit": "abc"}, "Limit must be a positive integer"),
+    ({"after": "not-a-cursor"}, "Invalid cursor"),
+])
+@pytest.mark.api
+def test_get_books_pagination_negative(api_client, params, expected_error):
+    response = api_client.get(TestConfig.API_BOOKS_URL, params=params)
+    data = response.json()
+    assert response.status_code == 400
+    assert data['error'] == expected_error
+
+
+@pytest.mark.api
+def test_get_books_stream_ndjson(api_client):
+    response = api_client.get(TestConfig.API_BOOKS_URL, headers={"Accept": "application/x-ndjson"}, stream=True)
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('application/x-ndjson')
+    books = [json.loads(line) for line in response.iter_lines() if line]
+    assert books
+    assert [book['id'] for book in books] == sorted(book['id'] for book in books)
+    expected_keys = {"author", "id", "isbn", "title"}
+    assert expected_keys.issubset(books[0].keys())
+
+
+@pytest.mark.api
+def test_get_books_stream_json_array(api_client):
+    response = api_client.get(TestConfig.API_BOOKS_URL, params={"stream": 1})
+    data = response.json()
+    assert response.status_code == 200
+    assert isinstance(data, list)
+    assert data[0]['title'] == "Mama Mia"
+
+
+@pytest.mark.parametrize("q, field", [
+    ("Mam", "title"),
+    ("Jo Do", "author"),
+    ("572913", "isbn"),
+    ("mama", "all"),
+])
+@pytest.mark.api
+def test_search_book_prefix(api_client, q, field):
+    response = api_client.get(f"{TestConfig.API_BOOKS_URL}/search", params={"q": q, "field": field})
+    data = response.json()
+    assert response.status_code == 200
+    assert data
+
+
+@pytest.mark.api
+def test_search_book_limit(api_client):
+    response = api_client.get(f"{TestConfig.API_BOOKS_URL}/search", params={"q": "Mama", "limit": 1})
+    data = response.json()
+    assert response.status_code == 200
+    assert len(data) == 1
+
+
+@pytest.mark.api
+def test_get_books_conditional(api_client):
+    response = api_client.get(TestConfig.API_BOOKS_URL)
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+
+    cached_response = api_client.get(TestConfig.API_BOOKS_URL, headers={"If-None-Match": etag})
+    assert cached_response.status_code == 304
+    assert cached_response.headers['ETag'] == etag
+
+    params = {"title": generate_random_string(8), "author": generate_random_string(8), "isbn": generate_random_isbn()}
+    assert api_client.post(TestConfig.API_BOOKS_URL, json=params).status_code == 201
+
+    changed_response = api_client.get(TestConfig.API_BOOKS_URL, headers={"If-None-Match": etag})
+    assert changed_response.status_code == 200
+    assert changed_response.headers['ETag'] != etag
+
+
+@pytest.mark.api
+def test_get_books_conditional_uncompressed(api_client):
+    headers = {"Accept-Encoding": "identity"}
+    response = api_client.get(TestConfig.API_BOOKS_URL, headers=headers)
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert not etag.startswith('W/')
+
+    cached_response = api_client.get(TestConfig.API_BOOKS_URL, headers={**headers, "If-None-Match": etag})
+    assert cached_response.status_code == 304
+    assert cached_response.headers['ETag'] == etag
+    assert 'Accept-Encoding' in cached_response.headers['Vary']
+
+
+@pytest.mark.api
+def test_get_book_conditional(api_client):
+    book_id = api_client.get(TestConfig.API_BOOKS_URL).json()[0]['id']
+    response = api_client.get(f"{TestConfig.API_BOOKS_URL}/{book_id}")
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+
+    cached_response = api_client.get(f"{TestConfig.API_BOOKS_URL}/{book_id}", headers={"If-None-Match": etag})
+    assert cached_response.status_code == 304
+
+
+@pytest.mark.api
+def test_search_book_cache(api_client):
+    params = {"q": "Mama", "field": "title"}
+    first_response = api_client.get(f"{TestConfig.API_BOOKS_URL}/search", params=params)
+    stats_before = api_client.get(f"{TestConfig.BASE_URL}/api/cache/stats").json()['search']
+
+    second_response = api_client.get(f"{TestConfig.API_BOOKS_URL}/search", params=params)
+    stats_after = api_client.get(f"{TestConfig.BASE_URL}/api/cache/stats").json()['search']
+
+    assert second_response.status_code == first_response.status_code
+    assert second_response.json() == first_response.json()
+    assert stats_after['hits'] == stats_before['hits'] + 1
+
+
+@pytest.mark.api
+def test_get_book_cache_invalidated_on_update(api_client):
+    params = {"title": generate_random_string(8), "author": generate_random_string(8), "isbn": generate_random_isbn()}
+    book = api_client.post(TestConfig.API_BOOKS_URL, json=params).json()
+    assert api_client.get(f"{TestConfig.API_BOOKS_URL}/{book['id']}").json()['title'] == params['title']
+
+    params['title'] = generate_random_string(8)
+    assert api_client.put(f"{TestConfig.API_BOOKS_URL}/{book['id']}", json=params).status_code == 200
+    assert api_client.get(f"{TestConfig.API_BOOKS_URL}/{book['id']}").json()['title'] == params['title']
+
+
+@pytest.mark.api
+def test_get_books_columns_format(api_client):
+    records = api_client.get(TestConfig.API_BOOKS_URL, params={"limit": 5}).json()
+    response = api_client.get(TestConfig.API_BOOKS_URL, params={"limit": 5, "format": "columns"})
+    data = response.json()
+    assert response.status_code == 200
+    assert set(data.keys()) == {"author", "id", "isbn", "title"}
+    assert data['id'] == [book['id'] for book in records]
+    assert data['title'] == [book['title'] for book in records]
+
+
+@pytest.mark.parametrize("params, expected_error", [
+    ({"format": "xml"}, "Format must be one of: records, columns"),
+    ({"format": "columns", "stream": 1}, "Only the records format can be streamed"),
+])
+@pytest.mark.api
+def test_get_books_format_negative(api_client, params, expected_error):
+    response = api_client.get(TestConfig.API_BOOKS_URL, params=params)
+    assert response.status_code == 400
+    assert response.json()['error'] == expected_error
+
+
+@pytest.mark.api
+def test_get_books_compressed(api_client):
+    response = api_client.get(TestConfig.API_BOOKS_URL, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == "gzip"
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.json()[0]['title'] == "Mama Mia"
+
+    cached_response = api_client.get(TestConfig.API_BOOKS_URL, headers={"Accept-Encoding": "gzip",
+                                                                       "If-None-Match": response.headers['ETag']})
+    assert cached_response.status_code == 304
+
+    stats = api_client.get(f"{TestConfig.BASE_URL}/api/compression/stats").json()['routes']['books.get_books']
+    assert stats['bytes_saved'] > 0
+
+
+@pytest.mark.api
+def test_get_books_uncompressed(api_client):
+    response = api_client.get(TestConfig.API_BOOKS_URL, headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+
+@pytest.mark.api
+def test_get_book_by_isbn(api_client):
+    isbn10 = generate_random_isbn10()
+    params = {"title": generate_random_string(8), "author": generate_random_string(8), "isbn": isbn10}
+    book = api_client.post(TestConfig.API_BOOKS_URL, json=params).json()
+
+    hyphenated = f"{isbn10[:1]}-{isbn10[1:5]}-{isbn10[5:9]}-{isbn10[9:]}"
+    for isbn in (isbn10, hyphenated, to_isbn13(isbn10)):
+        response = api_client.get(f"{TestConfig.API_BOOKS_URL}/isbn/{isbn}")
+        assert response.status_code == 200
+        assert response.json() == book
+
+    missing_response = api_client.get(f"{TestConfig.API_BOOKS_URL}/isbn/{generate_random_isbn()}")
+    assert missing_response.status_code == 404
+
+
+@pytest.mark.api
+def test_get_books_filter_by_author_sorted_by_title(api_client):
+    author = "Author " + generate_random_string(8)
+    titles = [generate_random_string(8) for _ in range(3)]
+    for title in titles:
+        params = {"title": title, "author": author, "isbn": generate_random_isbn()}
+        assert api_client.post(TestConfig.API_BOOKS_URL, json=params).status_code == 201
+
+    params = {"author": author, "sort": "title", "order": "desc", "limit": 2}
+    first_page = api_client.get(TestConfig.API_BOOKS_URL, params=params)
+    assert first_page.status_code == 200
+    next_url = first_page.links['next']['url']
+    second_page = api_client.get(next_url)
+    assert 'next' not in second_page.links
+
+    received = [book['title'] for book in first_page.json() + second_page.json()]
+    assert received == sorted(titles, reverse=True)
+
+
+@pytest.mark.api
+def test_get_books_created_range_sorted_by_created_at(api_client):
+    params = {"created_after": "2000-01-01", "sort": "created_at", "order": "desc", "limit": 5}
+    response = api_client.get(TestConfig.API_BOOKS_URL, params=params)
+    assert response.status_code == 200
+    assert 0 < len(response.json()) <= 5
+
+
+@pytest.mark.parametrize("params, expected_error", [
+    ({"sort": "isbn"}, "Sort must be one of: id, title, author, created_at"),
+    ({"sort": "title", "order": "up"}, "Order must be asc or desc"),
+    ({"created_after": "yesterday", "sort": "created_at"}, "created_after must be an ISO 8601 date or timestamp"),
+    ({"created_after": "2020-01-01", "sort": "title"}, "Filtering on created_at requires sort to be one of: created_at"),
+    ({"sort": "title", "after": "zzz"}, "Invalid cursor"),
+])
+@pytest.mark.api
+def test_get_books_filter_sort_negative(api_client, params, expected_error):
+    response = api_client.get(TestConfig.API_BOOKS_URL, params=params)
+    assert response.status_code == 400
+    assert response.json()['error'] == expected_error
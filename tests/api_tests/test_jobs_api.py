@@ -0,0 +1,104 @@
+import pytest
+import json
+import time
+import logging
+from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_string, generate_random_isbn
+
+logger = logging.getLogger('pytest')
+
+JOBS_URL = f"{TestConfig.BASE_URL}/api/jobs"
+BULK_URL = f"{TestConfig.API_BOOKS_URL}/bulk"
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+
+def wait_for_job(api_client, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = api_client.get(url).json()
+        if job['status'] in FINISHED:
+            return job
+        time.sleep(0.2)
+    pytest.fail(f"Job {url} did not finish within {timeout}s")
+
+
+def ndjson_books(count):
+    return ''.join(json.dumps({"title": "Job " + generate_random_string(10), "author": "Job Author",
+                               "isbn": generate_random_isbn()}) + '\n' for _ in range(count))
+
+
+@pytest.mark.api
+def test_async_bulk_import_reports_progress_and_result(api_client):
+    body = ndjson_books(50) + '{"title": "No author"}\n'
+    response = api_client.post(BULK_URL, params={"async": "1"}, data=body,
+                               headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 202
+    job = response.json()
+    assert job['kind'] == 'import'
+    assert job['status'] in ('queued', 'running')
+    assert response.headers['Location'].endswith(f"/api/jobs/{job['id']}")
+
+    job = wait_for_job(api_client, response.headers['Location'])
+    logger.info(f"Import job finished: {job['counts']}")
+    assert job['status'] == 'succeeded'
+    assert job['done'] == job['total'] == 51
+    assert job['result']['accepted'] == 50
+    assert job['result']['rejected'] == 1
+    assert job['result']['errors'][0]['row'] == 51
+
+
+@pytest.mark.api
+def test_cancel_job(api_client):
+    # Every row repeats one book, so the import spans many batches but adds at most one book
+    book = {"title": "Cancelled " + generate_random_string(10), "author": "Job Author",
+            "isbn": generate_random_isbn()}
+    response = api_client.post(BULK_URL, params={"async": "1"}, data=(json.dumps(book) + '\n') * 4000,
+                               headers={"Content-Type": "application/x-ndjson"})
+    if response.status_code == 503:
+        pytest.skip("The job runner is busy")
+    job_url = response.headers['Location']
+
+    # Cancel once the job has committed a batch, so it stops part of the way through
+    deadline = time.monotonic() + 30
+    job = api_client.get(job_url).json()
+    while job['done'] == 0 and job['status'] not in FINISHED and time.monotonic() < deadline:
+        time.sleep(0.02)
+        job = api_client.get(job_url).json()
+
+    try:
+        cancelled = api_client.post(f"{job_url}/cancel")
+        if cancelled.status_code == 409:
+            pytest.skip("The job finished before it could be cancelled")
+        assert cancelled.status_code == 202
+        assert cancelled.json()['cancel_requested'] is True
+
+        job = wait_for_job(api_client, job_url)
+        logger.info(f"Cancelled job after {job['done']} of {job['total']} rows")
+        assert job['status'] == 'cancelled'
+        assert 0 < job['done'] < job['total']
+        assert api_client.post(f"{job_url}/cancel").status_code == 409
+    finally:
+        imported = api_client.get(f"{TestConfig.API_BOOKS_URL}/isbn/{book['isbn']}")
+        if imported.status_code == 200:
+            api_client.delete(f"{TestConfig.API_BOOKS_URL}/{imported.json()['id']}")
+
+
+@pytest.mark.api
+def test_reindex_job(api_client):
+    response = api_client.post(f"{JOBS_URL}/reindex")
+    if response.status_code == 503:
+        assert response.headers['Retry-After']
+        pytest.skip("The job runner is busy")
+    assert response.status_code == 202
+
+    job = wait_for_job(api_client, response.headers['Location'])
+    assert job['status'] == 'succeeded'
+    assert job['done'] == job['total'] == 2
+
+
+@pytest.mark.api
+def test_unknown_job(api_client):
+    assert api_client.get(f"{JOBS_URL}/{'0' * 32}").status_code == 404
+    response = api_client.post(f"{JOBS_URL}/{'0' * 32}/cancel")
+    assert response.status_code == 404
+    assert response.json()['error'] == 'Job not found'
@@ -0,0 +1,47 @@
+import pytest
+import re
+import logging
+from project1.config.config import TestConfig
+
+logger = logging.getLogger('pytest')
+
+METRICS_URL = f"{TestConfig.BASE_URL}/metrics"
+
+
+def sample(body, name, **labels):
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf'^{name}{{{re.escape(label_text)}}} (\S+)$', body, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+@pytest.mark.api
+def test_metrics_exposition(api_client):
+    api_client.get(TestConfig.API_BOOKS_URL, params={"limit": 5})
+    response = api_client.get(METRICS_URL)
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain')
+    body = response.text
+    assert '# TYPE books_request_duration_seconds histogram' in body
+    assert '# TYPE books_request_sql_statements histogram' in body
+    assert 'books_requests_in_flight' in body
+
+
+@pytest.mark.api
+def test_metrics_count_requests_and_sql(api_client):
+    before = api_client.get(METRICS_URL).text
+    api_client.get(TestConfig.API_BOOKS_URL, params={"limit": 5})
+    after = api_client.get(METRICS_URL).text
+
+    labels = {"endpoint": "get_books", "method": "GET", "status": "200"}
+    assert sample(after, 'books_requests_total', **labels) == sample(before, 'books_requests_total', **labels) + 1
+    assert sample(after, 'books_request_sql_statements_sum', endpoint="get_books") > \
+        sample(before, 'books_request_sql_statements_sum', endpoint="get_books")
+
+
+@pytest.mark.api
+def test_traced_request_has_trace_id(api_client):
+    # The development server traces every request (TRACE_SAMPLE_RATE = 1.0)
+    first = api_client.get(TestConfig.API_BOOKS_URL, params={"limit": 5})
+    second = api_client.get(TestConfig.API_BOOKS_URL, params={"limit": 5})
+    assert re.fullmatch(r'[0-9a-f]{16}', first.headers['X-Trace-Id'])
+    assert first.headers['X-Trace-Id'] != second.headers['X-Trace-Id']
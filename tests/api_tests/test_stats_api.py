@@ -0,0 +1,52 @@
+import pytest
+import logging
+from datetime import datetime
+from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_string, generate_random_isbn
+
+logger = logging.getLogger('pytest')
+
+STATS_URL = f"{TestConfig.API_BOOKS_URL}/stats"
+
+
+def books_today(stats):
+    today = datetime.utcnow().date().isoformat()
+    return next((day['books'] for day in stats['days'] if day['day'] == today), 0)
+
+
+@pytest.mark.api
+def test_stats_follow_writes(api_client):
+    before = api_client.get(STATS_URL).json()
+    book = {"title": "Stats " + generate_random_string(10), "author": "Stats " + generate_random_string(10),
+            "isbn": generate_random_isbn()}
+    response = api_client.post(TestConfig.API_BOOKS_URL, json=book)
+    assert response.status_code == 201
+    book_id = response.json()['id']
+
+    after = api_client.get(STATS_URL).json()
+    assert after['total'] == before['total'] + 1
+    assert books_today(after) == books_today(before) + 1
+    assert sum(day['books'] for day in after['days']) == after['total']
+
+    assert api_client.delete(f"{TestConfig.API_BOOKS_URL}/{book_id}").status_code == 204
+    assert api_client.get(STATS_URL).json()['total'] == before['total']
+
+
+@pytest.mark.api
+def test_stats_top_authors_are_ordered(api_client):
+    response = api_client.get(STATS_URL, params={"limit": 5})
+    assert response.status_code == 200
+    authors = response.json()['authors']
+    assert len(authors) <= 5
+    assert authors == sorted(authors, key=lambda author: (-author['books'], author['author']))
+
+    etag = response.headers['ETag']
+    assert api_client.get(STATS_URL, params={"limit": 5}, headers={"If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.api
+@pytest.mark.parametrize("limit", ["0", "-3", "many"])
+def test_stats_reject_invalid_limit(api_client, limit):
+    response = api_client.get(STATS_URL, params={"limit": limit})
+    assert response.status_code == 400
+    assert response.json()['error'] == 'Limit must be a positive integer'
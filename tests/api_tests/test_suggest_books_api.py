@@ -0,0 +1,47 @@
+import pytest
+import random
+import string
+import logging
+from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_isbn
+
+logger = logging.getLogger('pytest')
+
+SUGGEST_URL = f"{TestConfig.API_BOOKS_URL}/suggest"
+
+
+@pytest.mark.api
+def test_suggest_new_book_by_prefix_and_infix(api_client):
+    word = ''.join(random.choices(string.ascii_lowercase, k=8))
+    book = {"title": f"Suggest {word}", "author": "Suggest Author", "isbn": generate_random_isbn()}
+    created = api_client.post(TestConfig.API_BOOKS_URL, json=book)
+    assert created.status_code == 201
+    book_id = created.json()['id']
+
+    for prefix in (f"suggest {word[:4]}", word[:5], word[2:7]):
+        response = api_client.get(SUGGEST_URL, params={"prefix": prefix, "field": "title"})
+        assert response.status_code == 200
+        assert book_id in [match['id'] for match in response.json()], prefix
+
+    api_client.delete(f"{TestConfig.API_BOOKS_URL}/{book_id}")
+    response = api_client.get(SUGGEST_URL, params={"prefix": word, "field": "title"})
+    assert book_id not in [match['id'] for match in response.json()]
+
+
+@pytest.mark.api
+def test_suggest_respects_limit(api_client):
+    response = api_client.get(SUGGEST_URL, params={"prefix": "a", "limit": 3})
+    assert response.status_code == 200
+    assert len(response.json()) <= 3
+
+
+@pytest.mark.parametrize("params, expected_error", [
+    ({}, "Prefix is required"),
+    ({"prefix": "  "}, "Prefix is required"),
+    ({"prefix": "ma", "field": "isbn"}, "Invalid suggest field"),
+])
+@pytest.mark.api
+def test_suggest_negative(api_client, params, expected_error):
+    response = api_client.get(SUGGEST_URL, params=params)
+    assert response.status_code == 400
+    assert response.json()['error'] == expected_error
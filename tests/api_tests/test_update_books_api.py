@@ -3,6 +3,7 @@ import logging
 import random
 import string
 from project1.config.config import TestConfig
+from project1.utils.utils import generate_random_isbn
 
 logger = logging.getLogger('pytest')
 
@@ -39,3 +40,45 @@ def test_update_book_negative(api_client, book_id, author, title, isbn, expected
 
     assert response.status_code == expected_status
     assert data.get("error") == expected_error or data.get("errors") == expected_error
+
+
+@pytest.mark.api
+def test_update_book_if_match(api_client):
+    params = {
+        "title": "Book " + ''.join(random.choices(string.ascii_letters, k=8)),
+        "author": "Author " + ''.join(random.choices(string.ascii_letters, k=8)),
+        "isbn": generate_random_isbn()
+    }
+    book = api_client.post(TestConfig.API_BOOKS_URL, json=params).json()
+    etag = api_client.get(f"{TestConfig.API_BOOKS_URL}/{book['id']}").headers['ETag']
+
+    params["title"] = "Book " + ''.join(random.choices(string.ascii_letters, k=8))
+    response = api_client.put(f"{TestConfig.API_BOOKS_URL}/{book['id']}", json=params, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+    params["title"] = "Book " + ''.join(random.choices(string.ascii_letters, k=8))
+    stale_response = api_client.put(f"{TestConfig.API_BOOKS_URL}/{book['id']}", json=params,
+                                    headers={"If-Match": etag})
+    assert stale_response.status_code == 412
+    assert stale_response.json()['error'] == "Book has been modified by another request"
+
+
+@pytest.mark.api
+@pytest.mark.parametrize("isbn, expected_error", [
+    ("abc", "ISBN must be numeric and either 10 or 13 digits long."),
+    ("97803064061570", "ISBN must be numeric and either 10 or 13 digits long."),
+    ("9780306406158", "ISBN check digit is invalid."),
+])
+def test_update_book_invalid_isbn(api_client, isbn, expected_error):
+    params = {
+        "title": "Book " + ''.join(random.choices(string.ascii_letters, k=8)),
+        "author": "Author " + ''.join(random.choices(string.ascii_letters, k=8)),
+        "isbn": generate_random_isbn()
+    }
+    book = api_client.post(TestConfig.API_BOOKS_URL, json=params).json()
+
+    response = api_client.put(f"{TestConfig.API_BOOKS_URL}/{book['id']}", json=dict(params, isbn=isbn))
+    assert response.status_code == 400
+    assert response.json()['error'] == expected_error
+    assert api_client.get(f"{TestConfig.API_BOOKS_URL}/isbn/{isbn}").status_code == 404
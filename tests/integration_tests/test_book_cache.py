@@ -0,0 +1,50 @@
+import os
+import time
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture(scope="module")
+def workers(tmp_path_factory):
+    previous_uri = os.environ.get('BOOKS_DATABASE_URI')
+    os.environ['BOOKS_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('cache') / 'books.db'}"
+    try:
+        import app as app_module
+        first = app_module.create_app()
+        app_module.init_db(first)
+        # Two apps on one database stand in for two gunicorn workers
+        yield app_module, first, app_module.create_app()
+    finally:
+        if previous_uri is None:
+            os.environ.pop('BOOKS_DATABASE_URI', None)
+        else:
+            os.environ['BOOKS_DATABASE_URI'] = previous_uri
+
+
+@pytest.mark.integration
+def test_book_cache_hits_make_no_query(workers):
+    app_module, first, second = workers
+    client = first.test_client()
+    book = {"title": "Cached", "author": "Cache Author", "isbn": "9780306406157"}
+    book_id = client.post('/api/books', json=book).get_json()['id']
+    assert client.get(f'/api/books/{book_id}').status_code == 200
+
+    queries = []
+    with first.app_context():
+        engine = app_module.db.engine
+
+    def listener(conn, cursor, statement, *args):
+        queries.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get(f'/api/books/{book_id}').get_json()['title'] == "Cached"
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert queries == []
+
+    # This worker's own write shows at once, another worker's after CATALOG_VERSION_TTL
+    client.put(f'/api/books/{book_id}', json=dict(book, title="Cached again"))
+    assert client.get(f'/api/books/{book_id}').get_json()['title'] == "Cached again"
+    second.test_client().put(f'/api/books/{book_id}', json=dict(book, title="Cached elsewhere"))
+    time.sleep(first.config['CATALOG_VERSION_TTL'])
+    assert client.get(f'/api/books/{book_id}').get_json()['title'] == "Cached elsewhere"
@@ -0,0 +1,91 @@
+import os
+import pytest
+
+
+@pytest.fixture(scope="module")
+def stats_app(tmp_path_factory):
+    previous_uri = os.environ.get('BOOKS_DATABASE_URI')
+    os.environ['BOOKS_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('stats') / 'books.db'}"
+    try:
+        import app as app_module
+        application = app_module.create_app()
+        app_module.init_db(application)
+        yield app_module, application
+    finally:
+        if previous_uri is None:
+            os.environ.pop('BOOKS_DATABASE_URI', None)
+        else:
+            os.environ['BOOKS_DATABASE_URI'] = previous_uri
+
+
+def isbn(i):
+    from utils.isbn import isbn13_check_digit
+    digits = '979' + str(300000000 + i)
+    return digits + isbn13_check_digit(digits)
+
+
+def drift(app_module, application):
+    with application.app_context():
+        return app_module.reconcile_stats(app_module.db.engine, rebuild=False)['drift']
+
+
+@pytest.mark.integration
+def test_every_write_path_keeps_the_stats_exact(stats_app):
+    app_module, application = stats_app
+    client = application.test_client()
+    for i, author in enumerate(["Ann Lee", "Ann Lee", "Bob Kay"]):
+        assert client.post('/api/books', json={"title": f"Single {i}", "author": author,
+                                               "isbn": isbn(i)}).status_code == 201
+    body = '\n'.join('{"title": "Bulk %d", "author": "Cal %s", "isbn": "%s"}' % (i, 'ABC'[i % 3], isbn(100 + i))
+                     for i in range(30))
+    assert client.post('/api/books/bulk', data=body, content_type='application/x-ndjson').status_code == 200
+    assert drift(app_module, application) == {}
+
+    stats = client.get('/api/books/stats', query_string={"limit": 2}).get_json()
+    assert stats['total'] == 33
+    assert stats['authors'] == [{"author": "Cal A", "books": 10}, {"author": "Cal B", "books": 10}]
+    assert sum(day['books'] for day in stats['days']) == 33
+
+    assert client.put('/api/books/1', json={"title": "Moved", "author": "Dee Moss",
+                                            "isbn": isbn(0)}).status_code == 200
+    assert client.patch('/api/books/batch', json={"books": [{"id": 2, "title": "Patched", "author": "Eve Hart",
+                                                             "isbn": isbn(1)}]}).status_code == 200
+    assert client.delete('/api/books/3').status_code == 204
+    assert client.delete('/api/books/batch', json={"ids": [4, 5]}).status_code == 200
+    assert drift(app_module, application) == {}
+
+    stats = client.get('/api/books/stats', query_string={"limit": 100}).get_json()
+    authors = {author['author']: author['books'] for author in stats['authors']}
+    assert stats['total'] == 30
+    assert authors['Dee Moss'] == authors['Eve Hart'] == 1
+    assert 'Ann Lee' not in authors and 'Bob Kay' not in authors
+
+
+@pytest.mark.integration
+def test_reconcile_command_rebuilds_drifted_stats(stats_app):
+    app_module, application = stats_app
+    with application.app_context(), app_module.db.engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE book_stats SET books = books + 5")
+        conn.exec_driver_sql("DELETE FROM book_day_stats")
+    runner = application.test_cli_runner()
+
+    result = runner.invoke(args=['books', 'reconcile-stats', '--check'])
+    assert result.exit_code == 1
+    assert set(drift(app_module, application)) == {'book_stats', 'book_day_stats'}
+
+    result = runner.invoke(args=['books', 'reconcile-stats'])
+    assert result.exit_code == 0, result.output
+    assert drift(app_module, application) == {}
+
+
+@pytest.mark.integration
+def test_top_authors_read_only_their_index_entries(stats_app):
+    app_module, application = stats_app
+    with application.app_context():
+        query = app_module.db.select(app_module.book_author_stats.c.author).order_by(
+            app_module.book_author_stats.c.books.desc(), app_module.book_author_stats.c.author).limit(10)
+        sql = str(query.compile(app_module.db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' | '.join(row[-1] for row in app_module.db.session.connection().exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {sql}'))
+    assert 'USING COVERING INDEX ix_book_author_stats_books' in plan
+    assert 'TEMP B-TREE' not in plan
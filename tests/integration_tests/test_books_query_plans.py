@@ -0,0 +1,73 @@
+import os
+import pytest
+import itertools
+from datetime import datetime
+
+
+@pytest.fixture(scope="module")
+def books_app(tmp_path_factory):
+    previous_uri = os.environ.get('BOOKS_DATABASE_URI')
+    os.environ['BOOKS_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'books.db'}"
+    try:
+        import app as app_module
+        application = app_module.create_app()
+        app_module.init_db(application)
+        with application.app_context():
+            yield app_module
+    finally:
+        if previous_uri is None:
+            os.environ.pop('BOOKS_DATABASE_URI', None)
+        else:
+            os.environ['BOOKS_DATABASE_URI'] = previous_uri
+
+
+def query_plan(app_module, query):
+    db = app_module.db
+    sql = str(query.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    connection = db.session.connection()
+    return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+
+
+def list_filters(fields):
+    filters = {}
+    if 'author' in fields:
+        filters['author'] = 'John Doe'
+    if 'created_at' in fields:
+        filters['created_after'] = datetime(2020, 1, 1)
+        filters['created_before'] = datetime(2030, 1, 1)
+    return filters
+
+
+def list_cursor(sort):
+    if sort == 'id':
+        return 100
+    return (datetime(2025, 1, 1) if sort == 'created_at' else 'M', 100)
+
+
+@pytest.mark.integration
+def test_every_supported_list_query_is_served_by_its_index(books_app):
+    for (fields, sort), index in books_app.BOOK_LIST_INDEXES.items():
+        for descending, paged in itertools.product((False, True), (False, True)):
+            after = list_cursor(sort) if paged else None
+            query = books_app.book_list_query(list_filters(fields), sort, descending, after).limit(101)
+            plan = ' | '.join(query_plan(books_app, query))
+            case = f"filters={sorted(fields)} sort={sort} descending={descending} paged={paged}: {plan}"
+
+            assert 'TEMP B-TREE' not in plan, case
+            if index == 'PRIMARY KEY':
+                assert 'USING INDEX' not in plan, case
+            else:
+                assert f'USING INDEX {index}' in plan or f'USING COVERING INDEX {index}' in plan, case
+
+
+@pytest.mark.parametrize("args, expected_error", [
+    ({"created_after": "2020-01-01"}, "Filtering on created_at requires sort to be one of: created_at"),
+    ({"created_before": "2020-01-01", "sort": "title"},
+     "Filtering on created_at requires sort to be one of: created_at"),
+    ({"author": "John Doe", "created_after": "2020-01-01", "sort": "author"},
+     "Filtering on author and created_at requires sort to be one of: created_at"),
+])
+@pytest.mark.integration
+def test_list_query_rejects_combinations_without_an_index(books_app, args, expected_error):
+    with pytest.raises(ValueError, match=expected_error):
+        books_app.parse_book_list_args(args)
@@ -0,0 +1,61 @@
+import os
+import pytest
+
+
+@pytest.fixture(scope="module")
+def import_app(tmp_path_factory):
+    previous_uri = os.environ.get('BOOKS_DATABASE_URI')
+    os.environ['BOOKS_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('import') / 'books.db'}"
+    try:
+        import app as app_module
+        application = app_module.create_app()
+        app_module.init_db(application)
+        with application.app_context():
+            yield app_module
+    finally:
+        if previous_uri is None:
+            os.environ.pop('BOOKS_DATABASE_URI', None)
+        else:
+            os.environ['BOOKS_DATABASE_URI'] = previous_uri
+
+
+def isbn(i):
+    from utils.isbn import isbn13_check_digit
+    digits = '979' + str(400000000 + i)
+    return digits + isbn13_check_digit(digits)
+
+
+@pytest.mark.integration
+def test_batch_rows_taken_meanwhile_are_rejected_not_fatal(import_app):
+    db = import_app.db
+    # Committed by another connection, as by a concurrent POST after the rows were validated
+    with db.engine.begin() as connection:
+        connection.execute(import_app.Book.__table__.insert(), {
+            'title': 'Raced', 'author': 'Racer', 'isbn': isbn(1), 'isbn13': isbn(1)})
+
+    # Validated rows carry their ISBN-13 key, as import_books leaves them
+    batch = [(row, {'title': f'Row {chr(64 + row)}', 'author': 'Importer', 'isbn': isbn(row), 'isbn13': isbn(row)})
+             for row in (1, 2, 3)]
+    batch.append((4, {'title': 'Row D', 'author': 'Importer', 'isbn': isbn(2), 'isbn13': isbn(2)}))
+    results = []
+    assert import_app.import_book_batch(batch, results) == 2
+    assert [result['status'] for result in results] == [409, 201, 201, 409]
+
+    logged = db.session.execute(db.select(import_app.BookChange.isbn).where(import_app.BookChange.op == 'insert')).scalars()
+    assert sorted(logged) == [isbn(2), isbn(3)]
+    assert import_app.reconcile_stats(db.engine, rebuild=False)['drift'] == {}
+
+
+@pytest.mark.integration
+def test_bulk_rows_are_read_from_any_stream_with_read(import_app):
+    class Body:
+        # Like gunicorn's request body: read() but no io interface
+        def __init__(self, data):
+            self.data = data
+
+        def read(self, size=-1):
+            chunk, self.data = self.data[:size], self.data[size:]
+            return chunk
+
+    rows = import_app.read_bulk_rows(Body(b'title,author,isbn\nA,B,1\nC,D,2\n'), 'text/csv')
+    assert [row['isbn'] for row in rows] == ['1', '2']
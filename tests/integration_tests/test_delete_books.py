@@ -0,0 +1,41 @@
+import os
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture(scope="module")
+def delete_app(tmp_path_factory):
+    previous_uri = os.environ.get('BOOKS_DATABASE_URI')
+    os.environ['BOOKS_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('delete') / 'books.db'}"
+    try:
+        import app as app_module
+        application = app_module.create_app()
+        app_module.init_db(application)
+        yield app_module, application.test_client()
+    finally:
+        if previous_uri is None:
+            os.environ.pop('BOOKS_DATABASE_URI', None)
+        else:
+            os.environ['BOOKS_DATABASE_URI'] = previous_uri
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("concurrent_write, expected_status", [
+    ("UPDATE book SET version = version + 1 WHERE id = ?", 409),
+    ("DELETE FROM book WHERE id = ?", 404),
+])
+def test_delete_racing_another_write(delete_app, concurrent_write, expected_status):
+    app_module, client = delete_app
+    book_id = client.post('/api/books', json={"title": "Raced", "author": "Racer",
+                                              "isbn": "9780306406157"}).get_json()['id']
+
+    # Another request commits between the handler reading the book and deleting it
+    def write_meanwhile(session, flush_context, instances):
+        with app_module.db.engine.begin() as connection:
+            connection.exec_driver_sql(concurrent_write, (book_id,))
+    event.listen(app_module.RoutingSession, 'before_flush', write_meanwhile, once=True)
+
+    response = client.delete(f'/api/books/{book_id}')
+    assert response.status_code == expected_status
+    assert 'sqlalchemy' not in response.get_data(as_text=True).lower()
+    client.delete(f'/api/books/{book_id}')
@@ -0,0 +1,146 @@
+import os
+import json
+import pytest
+
+SHARDS = 3
+
+
+@pytest.fixture(scope="module")
+def sharded(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('shards')
+    overrides = {
+        'BOOKS_DATABASE_URI': f"sqlite:///{directory / 'books.db'}",
+        'BOOKS_CONFIG_SHARD_DATABASE_URIS': json.dumps([f"sqlite:///{directory / f'books-{k}.db'}"
+                                                        for k in range(SHARDS)]),
+    }
+    previous = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        import app as app_module
+        application = app_module.create_app()
+        app_module.init_db(application)
+        yield app_module, application.test_client()
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def isbn_in_shard(shard, start=0):
+    """A valid ISBN-13 whose canonical key hashes to `shard`."""
+    from utils.isbn import isbn13_check_digit
+    from utils.shards import shard_for_key
+    for i in range(start, start + 10000):
+        digits = '979' + str(200000000 + i)
+        isbn = digits + isbn13_check_digit(digits)
+        if shard_for_key(isbn, SHARDS) == shard:
+            return isbn
+
+
+def create_book(client, isbn, title, author):
+    response = client.post('/api/books', json={"title": title, "author": author, "isbn": isbn})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['id']
+
+
+@pytest.mark.integration
+def test_books_are_created_in_the_shard_of_their_isbn(sharded):
+    app_module, client = sharded
+    from utils.shards import ID_SPAN
+    for shard in range(SHARDS):
+        isbn = isbn_in_shard(shard, start=100)
+        book_id = create_book(client, isbn, f"Placed {shard}", f"Placer {chr(65 + shard)}")
+        assert (book_id - 1) // ID_SPAN == shard
+        assert client.get(f'/api/books/{book_id}').get_json()['isbn'] == isbn
+        assert client.get(f'/api/books/isbn/{isbn}').get_json()['id'] == book_id
+
+
+@pytest.mark.integration
+def test_lists_merge_every_shard_in_order(sharded):
+    _, client = sharded
+    for shard in range(SHARDS):
+        create_book(client, isbn_in_shard(shard, start=200), f"Merged {shard}", f"Merger {chr(65 + shard)}")
+
+    ids, url = [], '/api/books?limit=2'
+    while url:
+        response = client.get(url)
+        ids += [book['id'] for book in response.get_json()]
+        link = response.headers.get('Link')
+        url = link[link.index('/api/'):link.index('>')] if link else None
+    assert ids == sorted(ids)
+    assert len(ids) == len(set(ids)) >= SHARDS
+
+    titles = [book['title'] for book in client.get('/api/books?sort=title&order=desc&limit=100').get_json()]
+    assert titles == sorted(titles, reverse=True)
+
+
+@pytest.mark.integration
+def test_isbn_stays_unique_when_an_update_moves_it_to_another_shard(sharded):
+    _, client = sharded
+    book_id = create_book(client, isbn_in_shard(0, start=300), "Moving Book", "Mover")
+    foreign_isbn = isbn_in_shard(1, start=300)
+
+    response = client.put(f'/api/books/{book_id}', json={"title": "Moving Book", "author": "Mover",
+                                                         "isbn": foreign_isbn})
+    assert response.status_code == 200
+    assert client.get(f'/api/books/isbn/{foreign_isbn}').get_json()['id'] == book_id
+
+    # The ISBN's shard knows it is taken, although the book lives elsewhere
+    response = client.post('/api/books', json={"title": "Copy", "author": "Copier", "isbn": foreign_isbn})
+    assert response.status_code == 409
+
+    client.delete(f'/api/books/{book_id}')
+    assert client.get(f'/api/books/isbn/{foreign_isbn}').status_code == 404
+    create_book(client, foreign_isbn, "Copy", "Copier")
+
+
+@pytest.mark.integration
+def test_whole_catalog_operations_without_a_single_database(sharded):
+    _, client = sharded
+    assert client.get('/api/books/changes').status_code == 501
+    assert client.delete('/api/books/batch', json={"ids": [1]}).status_code == 501
+
+
+@pytest.mark.integration
+def test_stats_sum_every_shard(sharded):
+    app_module, client = sharded
+    # Cid leads no shard on its own, but has the most books in total
+    books = [(0, "Stats Ann"), (0, "Stats Ann"), (0, "Stats Ann"), (1, "Stats Bob"), (1, "Stats Bob"),
+             (1, "Stats Bob")] + [(shard, "Stats Cid") for shard in range(SHARDS) for _ in range(2)]
+    for i, (shard, author) in enumerate(books):
+        create_book(client, isbn_in_shard(shard, start=400 + 50 * i), f"Counted {i}", author)
+
+    stats = client.get('/api/books/stats', query_string={"limit": 3}).get_json()
+    assert stats['authors'] == [{"author": "Stats Cid", "books": 6}, {"author": "Stats Ann", "books": 3},
+                                {"author": "Stats Bob", "books": 3}]
+    everything = client.get('/api/books', query_string={"limit": 1000}).get_json()
+    assert stats['total'] == len(everything)
+    assert sum(day['books'] for day in stats['days']) == len(everything)
+
+    result = app_module.app.test_cli_runner().invoke(args=['books', 'reconcile-stats', '--check'])
+    assert result.exit_code == 0, result.output
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork()")
+def test_a_forked_worker_can_scatter_after_the_parent_did(sharded):
+    app_module, client = sharded
+    # As gunicorn's master may before forking: the pool's threads now exist in this process only
+    assert client.get('/api/books?limit=5').status_code == 200
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            import signal
+            signal.alarm(10)
+            with client.application.app_context():
+                for engine in app_module.db.engines.values():
+                    engine.dispose(close=False)
+            status = 0 if client.get('/api/books?limit=5').status_code == 200 else 1
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
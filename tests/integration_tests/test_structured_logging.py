@@ -0,0 +1,26 @@
+import logging
+import threading
+import pytest
+
+
+@pytest.mark.integration
+def test_attaching_a_logger_again_stops_its_previous_writer():
+    from utils.structured_logging import attach_queue
+    logger = logging.getLogger('test_structured_logging')
+    records = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record.getMessage())
+
+    attach_queue(logger, [Collect()], 100)
+    threads = threading.active_count()
+    logger.warning("first")
+    for _ in range(3):
+        attach_queue(logger, [Collect()], 100)
+    logger.warning("last")
+    attach_queue(logger, [logging.NullHandler()], 100)
+
+    assert threading.active_count() == threads
+    # The replaced writers wrote what they had queued before stopping
+    assert records == ["first", "last"]
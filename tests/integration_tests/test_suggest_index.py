@@ -0,0 +1,71 @@
+import os
+import time
+import pytest
+
+
+@pytest.fixture(scope="module")
+def workers(tmp_path_factory):
+    previous_uri = os.environ.get('BOOKS_DATABASE_URI')
+    os.environ['BOOKS_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('suggest') / 'books.db'}"
+    try:
+        import app as app_module
+        writer = app_module.create_app()
+        app_module.init_db(writer)
+        # Two apps on one database stand in for two gunicorn workers
+        yield app_module, writer, app_module.create_app()
+    finally:
+        if previous_uri is None:
+            os.environ.pop('BOOKS_DATABASE_URI', None)
+        else:
+            os.environ['BOOKS_DATABASE_URI'] = previous_uri
+
+
+def isbn(i):
+    from utils.isbn import isbn13_check_digit
+    digits = '979' + str(500000000 + i)
+    return digits + isbn13_check_digit(digits)
+
+
+def suggested(client, prefix):
+    response = client.get('/api/books/suggest', query_string={"prefix": prefix})
+    assert response.status_code == 200
+    return [book['title'] for book in response.get_json()]
+
+
+@pytest.mark.integration
+def test_index_applies_writes_of_other_workers_in_place(workers):
+    _, writer, reader = workers
+    writer_client, reader_client = writer.test_client(), reader.test_client()
+    book_id = writer_client.post('/api/books', json={"title": "Zebra crossing", "author": "Ann Lee",
+                                                     "isbn": isbn(1)}).get_json()['id']
+    assert suggested(reader_client, "zebra") == ["Zebra crossing"]
+    built_at = reader.extensions['suggest_index'].built_at
+
+    writer_client.put(f'/api/books/{book_id}', json={"title": "Yak crossing", "author": "Ann Lee", "isbn": isbn(1)})
+    assert suggested(reader_client, "zebra") == []
+    assert suggested(reader_client, "yak") == ["Yak crossing"]
+    writer_client.delete(f'/api/books/{book_id}')
+    assert suggested(reader_client, "yak") == []
+
+    index = reader.extensions['suggest_index']
+    assert index.built_at == built_at
+    assert index.applied_changes == 2
+
+
+@pytest.mark.integration
+def test_index_rebuilds_in_the_background_past_the_catch_up_limit(workers):
+    app_module, writer, reader = workers
+    reader.config['SUGGEST_CATCH_UP_LIMIT'] = 5
+    reader.config['SUGGEST_REBUILD_INTERVAL'] = 0
+    body = '\n'.join('{"title": "Bulk %s", "author": "Importer", "isbn": "%s"}' % (chr(65 + i), isbn(100 + i))
+                     for i in range(10))
+    assert writer.test_client().post('/api/books/bulk', data=body,
+                                     content_type='application/x-ndjson').status_code == 200
+
+    reader_client = reader.test_client()
+    # The latest changes are applied at once, the older ones by the rebuild that follows
+    assert suggested(reader_client, "bulk") == [f"Bulk {chr(65 + i)}" for i in range(5, 10)]
+    deadline = time.time() + 5
+    while len(suggested(reader_client, "bulk")) < 10 and time.time() < deadline:
+        time.sleep(0.05)
+    assert len(suggested(reader_client, "bulk")) == 10
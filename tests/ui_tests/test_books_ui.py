@@ -1,6 +1,7 @@
 import time
 
 import pytest
+from selenium.webdriver.common.by import By
 from project1.pages.book_page import BookPage
 from project1.constant import *
 from project1.config.config import TestConfig
@@ -93,3 +94,16 @@ def test_duplicate_book(logged_in_driver):
     alert_text = book_page.is_duplicated_message()
     assert alert_text is not None, "Expected an alert, but none was found!"
     assert "Duplicate book detected! The book is already in the list." == alert_text, f"Unexpected alert text: {alert_text}"
+
+
+@pytest.mark.ui
+def test_books_pagination(logged_in_driver):
+    logged_in_driver.get(f"{TestConfig.BASE_URL}/{BOOKS_URL}?limit=2")
+    book_page = BookPage(logged_in_driver)
+    first_page = book_page.get_book_list()
+    assert len(first_page) == 2
+
+    logged_in_driver.find_element(By.ID, "next-page").click()
+    second_page = book_page.get_book_list()
+    assert second_page
+    assert second_page[0]['title'] not in [book['title'] for book in first_page]
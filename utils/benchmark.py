@@ -0,0 +1,123 @@
+"""Closed-loop HTTP load generator for the books API.
+
+    python -m utils.benchmark --url http://localhost:5000 --concurrency 16 --duration 10
+    python -m utils.benchmark --writes --concurrency 32 --duration 10
+
+Each client thread keeps one connection open and requests the given paths in
+turn for `duration` seconds; the totals are printed as one line per path.
+With --writes the clients instead POST new books with random valid ISBNs.
+"""
+import argparse
+import http.client
+import json
+import random
+import string
+import threading
+import time
+from urllib.parse import urlsplit
+
+from utils.isbn import isbn13_check_digit
+
+DEFAULT_PATHS = ['/api/books?limit=100', '/api/books/1', '/api/books/search?q=mama']
+WRITE_PATH = '/api/books'
+
+
+def random_isbn():
+    digits = '978' + ''.join(random.choices(string.digits, k=9))
+    return digits + isbn13_check_digit(digits)
+
+
+def book_body():
+    return json.dumps({
+        'title': 'Bench ' + ''.join(random.choices(string.ascii_letters, k=12)),
+        'author': 'Bench ' + ''.join(random.choices(string.ascii_letters, k=12)),
+        'isbn': random_isbn(),
+    })
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run_client(host, port, paths, deadline, latencies, errors, lock, writes=False):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    local = {path: [] for path in paths}
+    failed = {path: 0 for path in paths}
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if writes:
+                connection.request('POST', path, book_body(), {'Content-Type': 'application/json'})
+            else:
+                connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                failed[path] += 1
+        except (OSError, http.client.HTTPException):
+            failed[path] += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        local[path].append(time.perf_counter() - started)
+    connection.close()
+    with lock:
+        for path in paths:
+            latencies[path].extend(local[path])
+            errors[path] += failed[path]
+
+
+def run(url, paths, concurrency, duration, writes=False):
+    parts = urlsplit(url)
+    latencies = {path: [] for path in paths}
+    errors = {path: 0 for path in paths}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=run_client,
+                                args=(parts.hostname, parts.port or 80, paths, deadline, latencies, errors, lock, writes))
+               for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = []
+    for path in paths:
+        samples = latencies[path]
+        results.append({
+            'path': path,
+            'requests': len(samples),
+            'errors': errors[path],
+            'rps': len(samples) / duration,
+            'p50_ms': percentile(samples, 0.50) * 1000,
+            'p99_ms': percentile(samples, 0.99) * 1000,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--writes', action='store_true', help=f'POST new books to {WRITE_PATH} instead')
+    parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+    args = parser.parse_args()
+
+    paths = [WRITE_PATH] if args.writes else args.paths
+    results = run(args.url, paths, args.concurrency, args.duration, args.writes)
+    print(f"{'path':40} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for result in results:
+        print(f"{result['path']:40} {result['rps']:9.1f} {result['p50_ms']:8.2f} "
+              f"{result['p99_ms']:8.2f} {result['errors']:7}")
+    print(f"{'total':40} {sum(result['rps'] for result in results):9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+def available_encodings():
+    """Supported content codings, most preferred first."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate(accept_encodings, encodings):
+    """Pick the encoding the client rates highest, breaking ties by our preference."""
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body, encoding, gzip_level, brotli_quality):
+    if encoding == 'br':
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionStats:
+    """Per-route counters of bytes saved and CPU time spent compressing."""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, encoding, bytes_in, bytes_out, seconds, cached):
+        with self._lock:
+            stats = self._routes.setdefault(route, {
+                'responses': 0,
+                'cache_hits': 0,
+                'bytes_in': 0,
+                'bytes_out': 0,
+                'compress_seconds': 0.0,
+                'encodings': {}
+            })
+            stats['responses'] += 1
+            stats['cache_hits'] += cached
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['compress_seconds'] += seconds
+            stats['encodings'][encoding] = stats['encodings'].get(encoding, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {route: dict(stats,
+                                encodings=dict(stats['encodings']),
+                                bytes_saved=stats['bytes_in'] - stats['bytes_out'],
+                                compress_seconds=round(stats['compress_seconds'], 6))
+                    for route, stats in self._routes.items()}
+
@@ -0,0 +1,103 @@
+"""Streaming encoders for catalog exports.
+
+Each encoder takes the field names and an iterable of row batches, as read
+from a server-side cursor, and yields the encoded output batch by batch, so
+an export holds a single batch in memory whatever the size of the catalog.
+"""
+import csv
+import io
+
+from .serialization import dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pyarrow = None
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def available_formats():
+    """Export formats this process can encode; Parquet needs pyarrow."""
+    return ['csv', 'ndjson', 'parquet'] if pyarrow is not None else ['csv', 'ndjson']
+
+
+def encode_csv(fields, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(fields)
+    yield buffer.getvalue().encode()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+
+
+def encode_ndjson(fields, batches):
+    for rows in batches:
+        yield b''.join(dumps(dict(zip(fields, row))) + b'\n' for row in rows)
+
+
+class ChunkSink:
+    """Write-only file that hands back what was written since the last `drain`."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def encode_parquet(fields, types, batches):
+    """One row group per batch. `types` are Arrow type names; temporal ones are parsed from ISO strings."""
+    schema = pyarrow.schema([(field, pyarrow.type_for_alias(name)) for field, name in zip(fields, types)])
+    sink = ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            columns = list(zip(*rows))
+            arrays = []
+            for field in schema:
+                if pyarrow.types.is_temporal(field.type):
+                    arrays.append(pyarrow.array(columns[len(arrays)], pyarrow.string()).cast(field.type))
+                else:
+                    arrays.append(pyarrow.array(columns[len(arrays)], field.type))
+            writer.write_batch(pyarrow.record_batch(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        # Writes the footer; on an abandoned export it is simply discarded
+        writer.close()
+    yield sink.drain()
+
+
+def encode(format_name, fields, types, batches):
+    if format_name == 'parquet':
+        return encode_parquet(fields, types, batches)
+    if format_name == 'csv':
+        return encode_csv(fields, batches)
+    return encode_ndjson(fields, batches)
@@ -0,0 +1,42 @@
+"""ISBN normalization.
+
+Books are matched on a canonical key: the ISBN-13 form of a valid ISBN-10 or
+ISBN-13, so the same book entered either way collides. Values that are not
+valid ISBNs (rows written before checksums were checked) keep their own
+characters as the key.
+"""
+import re
+
+ISBN10_PATTERN = re.compile(r'^[0-9]{9}[0-9X]$')
+ISBN13_PATTERN = re.compile(r'^[0-9]{13}$')
+
+
+def clean(value):
+    """Drop the hyphens and spaces ISBNs are often printed with."""
+    return value.replace('-', '').replace(' ', '').upper()
+
+
+def isbn10_check_digit(digits):
+    check = (11 - sum((10 - i) * int(d) for i, d in enumerate(digits)) % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def isbn13_check_digit(digits):
+    # Weights alternate 1, 3; summing each half with map() keeps the loop in C for bulk imports
+    return str(-(sum(map(int, digits[::2])) + 3 * sum(map(int, digits[1::2]))) % 10)
+
+
+def to_isbn13(value):
+    """The ISBN-13 form of a valid ISBN-10 or ISBN-13, or None if `value` is neither."""
+    value = clean(value)
+    if ISBN10_PATTERN.match(value) and value[9] == isbn10_check_digit(value[:9]):
+        digits = '978' + value[:9]
+        return digits + isbn13_check_digit(digits)
+    if ISBN13_PATTERN.match(value) and value[12] == isbn13_check_digit(value[:12]):
+        return value
+    return None
+
+
+def isbn_key(value):
+    """Canonical lookup and uniqueness key of a stored ISBN."""
+    return to_isbn13(value) or clean(value)
@@ -0,0 +1,74 @@
+"""Bounded in-process runner for background jobs.
+
+Jobs run on a small thread pool next to the request threads. The pool and
+its queue are both capped: `submit` refuses work once `max_workers` jobs are
+running and `max_queued` more are waiting, so a burst of job requests gets
+an immediate refusal instead of piling up threads, memory and database
+writes behind the requests the worker is serving.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """The runner already holds as many jobs as it may."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been asked to stop."""
+
+
+class JobRunner:
+    def __init__(self, max_workers, max_queued):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stopping = threading.Event()
+
+    def _get_executor(self):
+        # Created on first use, so a preloading master never forks with pool threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='books-job')
+        return self._executor
+
+    def submit(self, fn, *args):
+        """Run `fn(*args)` on the pool, or raise QueueFull if the runner is at capacity."""
+        with self._lock:
+            if self._stopping.is_set() or self._pending >= self.max_workers + self.max_queued:
+                raise QueueFull()
+            self._pending += 1
+            future = self._get_executor().submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def full(self):
+        """Whether `submit` would currently refuse a job."""
+        with self._lock:
+            return self._stopping.is_set() or self._pending >= self.max_workers + self.max_queued
+
+    @property
+    def stopping(self):
+        """Set once `shutdown` has been called; running jobs should stop at their next checkpoint."""
+        return self._stopping.is_set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queued': self.max_queued,
+                'pending': self._pending,
+            }
+
+    def shutdown(self, wait=True):
+        """Refuse new jobs, drop queued ones and ask running ones to stop."""
+        self._stopping.set()
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
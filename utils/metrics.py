@@ -0,0 +1,89 @@
+"""Prometheus metrics for the books API.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set before this module is first
+imported, so every worker writes its samples to its own file in that
+directory and `render` sums them; without it the process-local registry is
+used.
+"""
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, \
+    generate_latest, multiprocess
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 4, 5, 10, 20, 50, 100, 500)
+
+REQUEST_LATENCY = Histogram(
+    'books_request_duration_seconds', 'Time spent handling a request, by endpoint',
+    ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    'books_requests_total', 'Requests handled, by endpoint and status',
+    ['endpoint', 'method', 'status'])
+IN_FLIGHT = Gauge(
+    'books_requests_in_flight', 'Requests currently being handled, by endpoint',
+    ['endpoint'], multiprocess_mode='livesum')
+SQL_STATEMENTS = Histogram(
+    'books_request_sql_statements', 'SQL statements issued per request, by endpoint',
+    ['endpoint'], buckets=STATEMENT_BUCKETS)
+SQL_DURATION = Histogram(
+    'books_request_sql_duration_seconds', 'Time spent in SQL per request, by endpoint',
+    ['endpoint'], buckets=LATENCY_BUCKETS)
+
+
+_children = {}
+
+
+class RequestMetrics:
+    """Timings and SQL totals of one request, recorded when it finishes.
+
+    The labelled children are resolved once per endpoint and reused, since
+    each `labels()` call takes a lock and builds a key.
+    """
+    __slots__ = ('endpoint', 'method', 'started', 'sql_statements', 'sql_seconds', 'children')
+
+    def __init__(self, endpoint, method):
+        self.endpoint = endpoint
+        self.method = method
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.children = _children.get((endpoint, method))
+        if self.children is None:
+            self.children = _children[(endpoint, method)] = (
+                REQUEST_LATENCY.labels(endpoint, method),
+                IN_FLIGHT.labels(endpoint),
+                SQL_STATEMENTS.labels(endpoint),
+                SQL_DURATION.labels(endpoint),
+            )
+        self.children[1].inc()
+        self.started = time.perf_counter()
+
+    def add_statement(self, seconds):
+        self.sql_statements += 1
+        self.sql_seconds += seconds
+
+    def record(self, status):
+        latency, _, statements, sql_duration = self.children
+        latency.observe(time.perf_counter() - self.started)
+        statements.observe(self.sql_statements)
+        sql_duration.observe(self.sql_seconds)
+        REQUESTS.labels(self.endpoint, self.method, status).inc()
+
+    def close(self):
+        self.children[1].dec()
+
+
+def render():
+    """Return the exposition body and its content type."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges from the multiprocess totals."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
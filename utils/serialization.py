@@ -0,0 +1,39 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def dumps(value):
+    """Encode `value` as compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def to_record(fields, row):
+    return dict(zip(fields, row))
+
+
+def to_records(fields, rows):
+    """[{field: value, ...}, ...] -- one object per row."""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def to_columns(fields, rows):
+    """{field: [value, ...], ...} -- one array per field, in row order.
+
+    Field names are sent once instead of once per row, which makes large
+    lists much smaller and lets clients load them straight into columns.
+    """
+    if not rows:
+        return {field: [] for field in fields}
+    return dict(zip(fields, map(list, zip(*rows))))
+
+
+FORMATS = {
+    'records': to_records,
+    'columns': to_columns,
+}
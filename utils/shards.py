@@ -0,0 +1,87 @@
+"""Routing and scatter-gather helpers for a catalog split across several SQLite files.
+
+Each shard is a complete catalog database: books, their full-text index,
+change log and catalog version. A book is created in the shard its ISBN
+hashes to, and takes its id from that shard's own range, so one book (by id
+or by ISBN) is always found in one shard. Two writes to different shards
+never wait for the same write lock. Lists, searches and exports ask every
+shard on a thread pool and merge the ordered results.
+"""
+import heapq
+import itertools
+import os
+import threading
+import weakref
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+# Shard k allocates ids from k * ID_SPAN + 1 upwards
+ID_SPAN = 10 ** 12
+
+# The shard that the database session is routed to, if any
+current_shard = ContextVar('current_shard', default=None)
+
+
+def shard_for_key(key, count):
+    """The shard a canonical ISBN belongs to. crc32 is stable across processes and restarts; hash() is not."""
+    return zlib.crc32(key.encode()) % count
+
+
+def shard_for_id(book_id, count):
+    """The shard whose id range holds `book_id`; ids past the last range map to the last shard."""
+    return min(max(book_id - 1, 0) // ID_SPAN, count - 1)
+
+
+def merge(results, key, descending=False, limit=None):
+    """Merge per-shard results that are each sorted by `key` into one sorted list."""
+    return list(itertools.islice(heapq.merge(*results, key=key, reverse=descending), limit))
+
+
+def merge_batches(results, key, batch_size, descending=False):
+    """Merge sorted per-shard row streams lazily, yielding lists of up to `batch_size` rows."""
+    merged = heapq.merge(*results, key=key, reverse=descending)
+    while True:
+        batch = list(itertools.islice(merged, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# Every ShardPool in the process, so each can be reset in a forked child
+_pools = weakref.WeakSet()
+
+
+class ShardPool:
+    """Runs one call per shard in parallel, on a thread per shard."""
+
+    def __init__(self, count):
+        self.count = count
+        self._executor = None
+        self._lock = threading.Lock()
+        _pools.add(self)
+
+    def _get_executor(self):
+        # Created on first use, and again in a forked child, whose copy has no threads behind it
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.count, thread_name_prefix='books-shard')
+            return self._executor
+
+    def map(self, fn):
+        """[fn(0), fn(1), ...] for every shard, in shard order."""
+        if self.count == 1:
+            return [fn(0)]
+        return list(self._get_executor().map(fn, range(self.count)))
+
+
+def _reset_after_fork():
+    # The pool threads do not survive fork(); a child submitting to the copied executor
+    # would wait forever, so let each child start its own threads and lock
+    for pool in _pools:
+        pool._executor = None
+        pool._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
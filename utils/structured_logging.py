@@ -0,0 +1,153 @@
+"""Queue-backed JSON logging.
+
+Loggers get a QueueHandler that only stamps the request context on each record
+and hands it to a bounded queue; a background QueueListener thread does all
+formatting and I/O. Messages are merged with their arguments on that thread,
+so `%s` arguments cost nothing on the request path unless they are emitted.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class Truncated:
+    """Defer repr() of a value to the writer thread and cap its length."""
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value, limit):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        text = repr(self.value)
+        if len(text) > self.limit:
+            return f'{text[:self.limit]}... ({len(text)} chars)'
+        return text
+
+    __repr__ = __str__
+
+
+class JSONFormatter(logging.Formatter):
+    converter = time.gmtime
+
+    def format(self, record):
+        entry = {
+            'timestamp': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Stamp each record with the caller's request context and sample chatty routes.
+
+    `context` returns a per-request dict of attributes to add (or None outside
+    a request). Endpoints listed in `sample_rates` keep their DEBUG and INFO
+    records only for that share of requests; the decision is made once per
+    request, so a kept request is logged in full.
+    """
+
+    def __init__(self, context, sample_rates, default_rate=1.0):
+        super().__init__()
+        self.context = context
+        self.sample_rates = sample_rates
+        self.default_rate = default_rate
+
+    def filter(self, record):
+        context = self.context()
+        if context is None:
+            return True
+        if 'sampled' not in context:
+            rate = self.sample_rates.get(context.get('endpoint'), self.default_rate)
+            context['sampled'] = rate >= 1.0 or random.random() < rate
+        record.__dict__.update(context)
+        return context['sampled'] or record.levelno >= logging.WARNING
+
+
+class DeferredQueueHandler(QueueHandler):
+    """A QueueHandler that leaves formatting to the listener and drops records when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock prepare() formats the message here, on the request thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_pipelines = []
+_pipelines_lock = threading.Lock()
+
+
+def attach_queue(logger, handlers, maxsize, context_filter=None):
+    """Route `logger` through a bounded queue drained by a background thread writing to `handlers`."""
+    log_queue = queue.Queue(maxsize)
+    handler = DeferredQueueHandler(log_queue)
+    if context_filter is not None:
+        handler.addFilter(context_filter)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    existing_handlers = list(logger.handlers)
+    for existing in existing_handlers:
+        logger.removeHandler(existing)
+    logger.addHandler(handler)
+    logger.propagate = False
+    listener.start()
+    with _pipelines_lock:
+        # A logger set up again (e.g. by another create_app) stops its previous writer
+        # thread, after it has written what was already queued, and closes its handlers
+        for previous in [pipeline for pipeline in _pipelines if pipeline[0] in existing_handlers]:
+            _pipelines.remove(previous)
+            if previous[1]._thread is not None:
+                previous[1].stop()
+            for old_handler in previous[1].handlers:
+                if old_handler not in handlers:
+                    old_handler.close()
+        _pipelines.append((handler, listener))
+    return handler
+
+
+def stop_all():
+    """Flush and stop every listener (e.g. at interpreter exit)."""
+    with _pipelines_lock:
+        for _, listener in _pipelines:
+            if listener._thread is not None:
+                listener.stop()
+
+
+def _restart_after_fork():
+    # The writer threads do not survive fork(); give each child fresh locks, queues and threads
+    global _pipelines_lock
+    _pipelines_lock = threading.Lock()
+    for handler, listener in _pipelines:
+        log_queue = queue.Queue(handler.queue.maxsize)
+        handler.queue = listener.queue = log_queue
+        listener._thread = None
+        listener.start()
+
+
+atexit.register(stop_all)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
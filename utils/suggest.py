@@ -0,0 +1,197 @@
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+
+FIELDS = ('title', 'author')
+
+
+def normalize(text, max_length):
+    return ' '.join(text.lower().split())[:max_length]
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SuggestIndex:
+    """In-memory type-ahead index over book titles and authors.
+
+    Per field it keeps two sorted lists of (key, book_id): whole normalized
+    values, and every later word of a value, so a prefix lookup is a bisect
+    plus a short scan.  An optional trigram map answers infix queries when
+    the prefixes alone return too few matches.  Keys are cut to
+    `max_key_length` characters and at most `max_books` books are indexed,
+    which bounds the memory used.
+
+    `position` names the catalog state the index reflects; the app uses the
+    last change-log seq of each database.  `apply` brings the index forward
+    in place with the changes made since, and marks it `stale` when some of
+    them were skipped.  `build` fills new structures without holding the
+    lock and only takes it to swap them in, so lookups are never held up by
+    a build.
+    """
+
+    def __init__(self, max_books, max_key_length, use_trigrams):
+        self.max_books = max_books
+        self.max_key_length = max_key_length
+        self.use_trigrams = use_trigrams
+        self._lock = threading.RLock()
+        self._reset()
+        self.position = None
+        self.stale = False
+        self.applied_changes = 0
+        self.built_at = None
+        self.build_seconds = None
+
+    def _reset(self):
+        self._books = {}
+        self._values = {field: [] for field in FIELDS}
+        self._words = {field: [] for field in FIELDS}
+        self._trigrams = {field: {} for field in FIELDS}
+        self.truncated = False
+
+    def _entries(self, title, author):
+        for field, value in zip(FIELDS, (title, author)):
+            key = normalize(value, self.max_key_length)
+            words = key.split(' ')[1:]
+            yield field, key, [word for word in words if word]
+
+    def _insert(self, book_id, title, author, sort):
+        if len(self._books) >= self.max_books and book_id not in self._books:
+            self.truncated = True
+            return
+        self._books[book_id] = (title, author)
+        # A full build appends and sorts once at the end; single writes keep the lists sorted
+        add = insort if sort else list.append
+        for field, key, words in self._entries(title, author):
+            add(self._values[field], (key, book_id))
+            for word in words:
+                add(self._words[field], (word, book_id))
+            if self.use_trigrams:
+                index = self._trigrams[field]
+                for trigram in trigrams(key):
+                    index.setdefault(trigram, set()).add(book_id)
+
+    def _delete(self, book_id):
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return
+        for field, key, words in self._entries(*book):
+            for entries, entry_key in [(self._values[field], key)] + [(self._words[field], word) for word in words]:
+                position = bisect_left(entries, (entry_key, book_id))
+                if position < len(entries) and entries[position] == (entry_key, book_id):
+                    del entries[position]
+            if self.use_trigrams:
+                index = self._trigrams[field]
+                for trigram in trigrams(key):
+                    ids = index.get(trigram)
+                    if ids is not None:
+                        ids.discard(book_id)
+                        if not ids:
+                            del index[trigram]
+
+    def build(self, rows, position):
+        """Replace the contents with `rows` of (id, title, author) read at `position`."""
+        started = time.perf_counter()
+        staging = SuggestIndex(self.max_books, self.max_key_length, self.use_trigrams)
+        for book_id, title, author in rows:
+            staging._insert(book_id, title, author, sort=False)
+        for field in FIELDS:
+            staging._values[field].sort()
+            staging._words[field].sort()
+        with self._lock:
+            self._books, self._values, self._words = staging._books, staging._values, staging._words
+            self._trigrams, self.truncated = staging._trigrams, staging.truncated
+            self.position = position
+            self.stale = False
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - started
+
+    def apply(self, changes, since, position, skipped=False):
+        """Apply the (op, book_id, title, author) changes made between `since` and `position`, in order.
+
+        Each change carries the book's whole new state, so the latest ones
+        can be applied without those before them; pass `skipped` when some
+        were left out, and the index stays `stale` until the next build.
+        Returns False, changing nothing, if the index is no longer at `since`
+        (a build swapped in other contents meanwhile).
+        """
+        with self._lock:
+            if self.position != since:
+                return False
+            for op, book_id, title, author in changes:
+                self._delete(book_id)
+                if op != 'delete':
+                    self._insert(book_id, title, author, sort=True)
+            self.position = position
+            self.stale = self.stale or skipped
+            self.applied_changes += len(changes)
+            return True
+
+    def _prefix_matches(self, entries, prefix, limit, seen, results):
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(results) < limit:
+            key, book_id = entries[position]
+            if not key.startswith(prefix):
+                break
+            if book_id not in seen:
+                seen.add(book_id)
+                results.append(book_id)
+            position += 1
+
+    def suggest(self, prefix, fields=FIELDS, limit=10):
+        """Up to `limit` book ids: whole-value prefix matches, then word prefix matches, then infix matches."""
+        prefix = normalize(prefix, self.max_key_length)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            for field in fields:
+                self._prefix_matches(self._values[field], prefix, limit, seen, results)
+            for field in fields:
+                self._prefix_matches(self._words[field], prefix, limit, seen, results)
+            if self.use_trigrams and len(results) < limit and len(prefix) >= 3:
+                for field in fields:
+                    index = self._trigrams[field]
+                    candidate_sets = sorted((index.get(trigram, set()) for trigram in trigrams(prefix)), key=len)
+                    candidates = set.intersection(*candidate_sets) - seen if candidate_sets else set()
+                    position = FIELDS.index(field)
+                    for book_id in sorted(candidates):
+                        if len(results) >= limit:
+                            break
+                        if prefix in normalize(self._books[book_id][position], self.max_key_length):
+                            seen.add(book_id)
+                            results.append(book_id)
+            return [(book_id, *self._books[book_id]) for book_id in results]
+
+    def memory_bytes(self):
+        """Approximate size of the index structures (containers, tuples and strings)."""
+        with self._lock:
+            size = sys.getsizeof(self._books)
+            for book_id, book in self._books.items():
+                size += sys.getsizeof(book) + sum(sys.getsizeof(value) for value in book)
+            for field in FIELDS:
+                for entries in (self._values[field], self._words[field]):
+                    size += sys.getsizeof(entries)
+                    size += sum(sys.getsizeof(entry) + sys.getsizeof(entry[0]) for entry in entries)
+                index = self._trigrams[field]
+                size += sys.getsizeof(index)
+                size += sum(sys.getsizeof(trigram) + sys.getsizeof(ids) for trigram, ids in index.items())
+            return size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'books': len(self._books),
+                'max_books': self.max_books,
+                'truncated': self.truncated,
+                'keys': sum(len(self._values[field]) + len(self._words[field]) for field in FIELDS),
+                'trigrams': sum(len(self._trigrams[field]) for field in FIELDS) if self.use_trigrams else None,
+                'position': list(self.position) if self.position is not None else None,
+                'stale': self.stale,
+                'applied_changes': self.applied_changes,
+                'built_at': self.built_at,
+                'build_seconds': round(self.build_seconds, 4) if self.build_seconds is not None else None,
+                'memory_bytes': self.memory_bytes()
+            }
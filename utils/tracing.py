@@ -0,0 +1,92 @@
+"""Lightweight per-request tracing.
+
+A sampled request gets a Trace holding one root span for the request and
+child spans for every SQL statement and template render. Finished traces are
+appended to a JSONL file, one object per line.
+"""
+import json
+import os
+import threading
+import time
+
+STATEMENT_PREVIEW = 500
+
+
+class Trace:
+    __slots__ = ('trace_id', 'name', 'method', 'path', 'wall_started', 'started', 'spans', 'statement_counts',
+                 'open_templates')
+
+    def __init__(self, name, method, path):
+        self.trace_id = os.urandom(8).hex()
+        self.name = name
+        self.method = method
+        self.path = path
+        self.wall_started = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.statement_counts = {}
+        self.open_templates = []
+
+    def add_span(self, kind, name, started, duration, **attributes):
+        self.spans.append({
+            'span_id': len(self.spans) + 1,
+            'parent_id': 0,
+            'kind': kind,
+            'name': name,
+            'offset_ms': round((started - self.started) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3),
+            **attributes
+        })
+
+    def add_statement(self, statement, started, duration, executemany):
+        self.statement_counts[statement] = self.statement_counts.get(statement, 0) + 1
+        self.add_span('sql', statement.split(None, 1)[0].upper() if statement else 'SQL', started, duration,
+                      statement=statement[:STATEMENT_PREVIEW], executemany=executemany)
+
+    def start_template(self, name):
+        self.open_templates.append((name, time.perf_counter()))
+
+    def end_template(self):
+        if self.open_templates:
+            name, started = self.open_templates.pop()
+            self.add_span('template', name, started, time.perf_counter() - started)
+
+    def repeated_statements(self, threshold):
+        """SELECTs issued at least `threshold` times -- the signature of an N+1 loop."""
+        return [{'statement': statement[:STATEMENT_PREVIEW], 'count': count}
+                for statement, count in self.statement_counts.items()
+                if count >= threshold and statement.lstrip()[:6].upper() == 'SELECT']
+
+    def finish(self, status, n_plus_one_threshold):
+        duration = time.perf_counter() - self.started
+        return {
+            'trace_id': self.trace_id,
+            'timestamp': self.wall_started,
+            'name': self.name,
+            'method': self.method,
+            'path': self.path,
+            'status': status,
+            'duration_ms': round(duration * 1000, 3),
+            'sql_statements': sum(self.statement_counts.values()),
+            'sql_ms': round(sum(span['duration_ms'] for span in self.spans if span['kind'] == 'sql'), 3),
+            'n_plus_one': self.repeated_statements(n_plus_one_threshold),
+            'spans': self.spans
+        }
+
+
+class TraceExporter:
+    """Append finished traces to a JSONL file shared by all workers."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = (json.dumps(trace, default=str) + '\n').encode()
+        with self._lock:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            # One O_APPEND write per trace, so lines from different workers never interleave
+            os.write(self._fd, line)
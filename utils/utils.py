@@ -1,10 +1,22 @@
 import random
 import string
 
+from .isbn import isbn10_check_digit, isbn13_check_digit
+
 
 def generate_random_string(length):
     return ''.join(random.choices(string.ascii_letters, k=length))
 
 
 def generate_random_isbn():
-    return ''.join(random.choices(string.digits, k=13))
+    digits = '978' + ''.join(random.choices(string.digits, k=9))
+    return digits + isbn13_check_digit(digits)
+
+
+def generate_random_isbn10():
+    # Skip check digit X, which the API does not accept
+    while True:
+        digits = ''.join(random.choices(string.digits, k=9))
+        check = isbn10_check_digit(digits)
+        if check != 'X':
+            return digits + check